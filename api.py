@@ -0,0 +1,150 @@
+"""Versioned JSON read API.
+
+Collections are served as {"fields": [...], "data": [[...], ...], "next": cursor}:
+rows are arrays in `fields` order and are streamed from a server-side cursor
+as they are read, so `limit=all` exports a whole table in constant memory.
+"""
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from listings import filtered
+from models import db, genre_names, Artist, Show, Venue
+from pagination import InvalidCursor, after_cursor, encode_cursor, page_limit, sort_key
+from replicas import read_only
+from streaming import dumps, stream
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def _columns(model, names):
+    return {name: genre_names(model) if name == 'genres' else getattr(model, name)
+            for name in names}
+
+
+def _genre_list(value):
+    return sorted(value.split(',')) if value else []
+
+
+RESOURCES = {
+    'artists': {
+        'model': Artist,
+        'key': (Artist.name, Artist.id),
+        'fields': _columns(Artist, (
+            'id', 'name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link',
+            'website', 'seeking_venue', 'seeking_description', 'upcoming_shows_count',
+            'past_shows_count', 'updated_at')),
+    },
+    'venues': {
+        'model': Venue,
+        'key': (Venue.name, Venue.id),
+        'fields': _columns(Venue, (
+            'id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+            'facebook_link', 'website', 'seeking_talent', 'seeking_description',
+            'upcoming_shows_count', 'past_shows_count', 'updated_at')),
+    },
+    'shows': {
+        'model': Show,
+        'key': (Show.start_time, Show.id),
+        'fields': dict(_columns(Show, (
+            'id', 'artist_id', 'venue_id', 'start_time', 'end_time', 'updated_at')), **{
+            'artist_name': Artist.name,
+            'artist_image_link': Artist.image_link,
+            'venue_name': Venue.name,
+            'venue_city': Venue.city,
+            'venue_state': Venue.state,
+        }),
+    },
+}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _selected_fields(resource):
+    fields = resource['fields']
+    requested = request.args.get('fields')
+    if not requested:
+        return list(fields)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise BadRequest(f'Unknown fields: {", ".join(unknown)}')
+    return names
+
+
+def _base_query(resource, columns):
+    query = db.session.query(*columns)
+    if resource['model'] is Show:
+        query = query.select_from(Show).join(Artist, Artist.id == Show.artist_id).join(
+            Venue, Venue.id == Show.venue_id)
+    return query
+
+
+def _values(names, row):
+    # Genres are aggregated into one comma-separated column per row.
+    return [_genre_list(value) if name == 'genres' else value for name, value in zip(names, row)]
+
+
+@bp.errorhandler(BadRequest)
+def bad_request(error):
+    return jsonify(error=str(error)), 400
+
+
+@bp.errorhandler(InvalidCursor)
+def invalid_cursor(error):
+    return jsonify(error='Invalid cursor'), 400
+
+
+@bp.errorhandler(404)
+def not_found(error):
+    return jsonify(error='Not found'), 404
+
+
+@bp.route('/<any(artists, venues, shows):name>')
+@read_only
+def collection(name):
+    """One keyset page of a collection; `limit=all` streams every row."""
+    resource = RESOURCES[name]
+    names = _selected_fields(resource)
+    key = resource['key']
+    limit = None if request.args.get('limit') == 'all' else page_limit(request.args.get('limit'))
+
+    # The key columns are always selected, after the requested ones, to build the cursor.
+    query = _base_query(resource, [resource['fields'][field] for field in names] + list(key))
+    if resource['model'] is not Show:
+        query = filtered(query, resource['model'], genre=request.args.get('genre'),
+                         city=request.args.get('city'), state=request.args.get('state'))
+    cursor = request.args.get('after')
+    if cursor:
+        query = after_cursor(query, key, cursor)
+    query = query.order_by(*sort_key(key))
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    width = len(names)
+
+    def generate():
+        yield '{"fields":' + dumps(names) + ',"data":['
+        last = None
+        for count, row in enumerate(stream(query)):
+            if limit is not None and count == limit:
+                yield '],"next":' + dumps(encode_cursor(last[width:])) + '}'
+                return
+            yield (',' if last is not None else '') + dumps(_values(names, row[:width]))
+            last = row
+        yield '],"next":null}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+@bp.route('/<any(artists, venues, shows):name>/<int:entity_id>')
+@read_only
+def item(name, entity_id):
+    resource = RESOURCES[name]
+    names = _selected_fields(resource)
+    model = resource['model']
+    row = _base_query(resource, [resource['fields'][field] for field in names]).filter(
+        model.id == entity_id).first()
+    if row is None:
+        return not_found(None)
+    return Response(dumps(dict(zip(names, _values(names, row)))), mimetype='application/json')
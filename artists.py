@@ -0,0 +1,166 @@
+import json
+
+from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
+
+import cache
+import conditional
+import details
+import listings
+import profiling
+import replicas
+import search
+import tasks
+from models import db, Artist, Genre, Show
+from pagination import request_page
+
+bp = Blueprint('artists', __name__)
+
+
+#  Create Artist
+
+
+@bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+    from forms import ArtistForm
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+
+@bp.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+    try:
+        artist = Artist(
+            name=request.form['name'],
+            city=request.form['city'],
+            state=request.form['state'],
+            phone=request.form['phone'],
+            genres=Genre.named(request.form.getlist('genres')),
+            image_link=request.form['image_link'],
+            facebook_link=request.form['facebook_link'],
+            seeking_venue=json.loads(request.form['seeking_venue'].lower()),
+            website=request.form['website'],
+            seeking_description=request.form['seeking_description']
+        )
+        db.session.add(artist)
+        tasks.saved(artist)
+        db.session.commit()
+        cache.invalidate('artists')
+        flash('Artist ' + request.form['name'] +
+              ' was successfully listed!')
+    except Exception as e:
+        print(e)
+        flash('An error occurred. Artist ' + request.form['name'] + ' could not be added')
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+        return render_template('pages/home.html')
+
+
+# Get Artist
+
+
+@bp.route('/artists')
+@replicas.read_only
+@profiling.query_budget(2)
+@conditional.conditional(lambda: conditional.listing_version(Artist))
+@cache.cached_page('artists')
+def artists():
+    query = listings.filtered(db.session.query(Artist.id, Artist.name), Artist, **listings.request_filters())
+    response, next_cursor = request_page(query, (Artist.name, Artist.id))
+    return render_template('pages/artists.html',
+                           artists=response,
+                           next_cursor=next_cursor)
+
+
+@bp.route('/artists/<int:artist_id>')
+@replicas.read_only
+@profiling.query_budget(4)
+@conditional.conditional(conditional.artist_version)
+@cache.cached_page('artist:{artist_id}')
+def show_artist(artist_id):
+    detail = details.load_artist(artist_id)
+    if detail is None:
+        abort(404)
+    artist, genres, past_shows, upcoming_shows, next_show_at = detail
+    cache.expire_at(next_show_at)
+
+    response = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+        "suggested_venues": details.suggested('artist', artist_id),
+    }
+    return render_template('pages/show_artist.html', artist=response)
+
+
+# Update Artist
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+    from forms import ArtistForm
+    form = ArtistForm()
+    artist = Artist.query.filter(Artist.id == artist_id).first()
+
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+    try:
+        artist = Artist.query.filter(Artist.id == artist_id).first()
+
+        artist.name = request.form['name']
+        artist.city = request.form['city']
+        artist.state = request.form['state']
+        artist.phone = request.form['phone']
+        artist.genres = Genre.named(request.form.getlist('genres'))
+        artist.image_link = request.form['image_link']
+        artist.facebook_link = request.form['facebook_link']
+        artist.seeking_venue = json.loads(request.form['seeking_venue'].lower())
+        artist.website = request.form['website']
+        artist.seeking_description = request.form['seeking_description']
+
+        db.session.add(artist)
+        tasks.saved(artist)
+        db.session.commit()
+        invalidate_artist_pages(artist_id)
+        return redirect(url_for('artists.show_artist', artist_id=artist_id))
+    except Exception as e:
+        print(e)
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+
+
+@bp.route('/artists/search', methods=['GET', 'POST'])
+@replicas.read_only
+@profiling.query_budget(2)
+def search_artists():
+    search_term = request.values.get('search_term', '')
+    response = search.search_artists(search_term, **search.request_options())
+
+    return render_template('pages/search_artists.html',
+                           results=response,
+                           search_term=search_term)
+
+
+def invalidate_artist_pages(artist_id):
+    # Venue pages list the artists of their shows.
+    venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+    cache.invalidate('artists', 'shows', f'artist:{artist_id}',
+                     *(f'venue:{venue_id}' for venue_id, in venue_ids))
@@ -0,0 +1,380 @@
+"""Route benchmarks.
+
+`flask bench` replays a request to every read route, the search pages, the
+API and the availability check. It runs them through the Flask test client
+and then over HTTP against a local WSGI server, and records p50/p95/p99
+latency, SQL statements per request and peak Python allocations per route.
+Results are written as JSON, and `flask bench-compare` diffs two result
+files, e.g. from two commits. `flask bench-startup` measures cold starts:
+importing and building the app and serving its first request in fresh
+interpreters.
+
+Routes that change data (create/edit submissions, imports) and the bulk
+exports are not benchmarked.
+"""
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from werkzeug.serving import make_server
+
+import cache
+import replicas
+from models import db, Artist, Genre, Show, Venue
+
+PERCENTILES = (50, 95, 99)
+# Latency regressions smaller than this are treated as noise by bench-compare.
+NOISE = 0.10
+
+
+def _bench_requests():
+    """The (name, method, path, body) requests to benchmark."""
+    artist = db.session.query(Artist.id, Artist.name).order_by(Artist.id).first()
+    venue = db.session.query(Venue.id, Venue.name).order_by(Venue.id).first()
+    show = db.session.query(Show.artist_id, Show.venue_id, Show.start_time).order_by(
+        Show.start_time.desc()).first()
+    genre = db.session.query(Genre.name).order_by(Genre.id).first()
+    if artist is None or venue is None or show is None or genre is None:
+        raise click.ClickException('Seed the database first, e.g. with `flask seed`.')
+
+    return [
+        ('index', 'GET', '/', None),
+        ('artists', 'GET', '/artists', None),
+        ('artists_by_genre', 'GET', f'/artists?genre={quote(genre.name)}', None),
+        ('show_artist', 'GET', f'/artists/{artist.id}', None),
+        ('edit_artist', 'GET', f'/artists/{artist.id}/edit', None),
+        ('create_artist_form', 'GET', '/artists/create', None),
+        ('search_artists', 'POST', '/artists/search', {'search_term': artist.name[:3]}),
+        ('venues', 'GET', '/venues', None),
+        ('venues_by_genre', 'GET', f'/venues?genre={quote(genre.name)}', None),
+        ('show_venue', 'GET', f'/venues/{venue.id}', None),
+        ('edit_venue', 'GET', f'/venues/{venue.id}/edit', None),
+        ('create_venue_form', 'GET', '/venues/create', None),
+        ('search_venues', 'POST', '/venues/search', {'search_term': venue.name[:3]}),
+        ('shows', 'GET', '/shows', None),
+        ('create_shows', 'GET', '/shows/create', None),
+        ('availability', 'POST', '/shows/availability', {'slots': [{
+            'artist_id': show.artist_id,
+            'venue_id': show.venue_id,
+            'start_time': show.start_time.strftime('%Y-%m-%d %H:%M'),
+        }]}),
+        ('api_artists', 'GET', '/api/v1/artists', None),
+        ('api_artist', 'GET', f'/api/v1/artists/{artist.id}', None),
+        ('api_venues', 'GET', '/api/v1/venues', None),
+        ('api_venue', 'GET', f'/api/v1/venues/{venue.id}', None),
+        ('api_shows', 'GET', '/api/v1/shows', None),
+    ]
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+class QueryCounter:
+    """Counts the SQL statements `engines` execute while it is installed."""
+
+    def __init__(self, engines):
+        self.engines = engines
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def _executed(self, conn, cursor, statement, parameters, context, executemany):
+        with self.lock:
+            self.count += 1
+
+    def __enter__(self):
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._executed)
+        return self
+
+    def __exit__(self, *exc_info):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._executed)
+
+
+def _client_send(client):
+    def send(method, path, body):
+        if method == 'POST' and path == '/shows/availability':
+            response = client.post(path, json=body)
+        else:
+            response = client.open(path, method=method, data=body)
+        return response.status_code, response.get_data()
+    return send
+
+
+def _server_send(base_url):
+    def send(method, path, body):
+        data = headers = None
+        if body is not None:
+            if path == '/shows/availability':
+                data, headers = json.dumps(body).encode(), {'Content-Type': 'application/json'}
+            else:
+                data = '&'.join(f'{key}={quote(str(value))}' for key, value in body.items()).encode()
+                headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        request = Request(base_url + path, data=data, headers=headers or {}, method=method)
+        try:
+            with urlopen(request) as response:
+                return response.status, response.read()
+        except HTTPError as e:
+            return e.code, e.read()
+    return send
+
+
+def _measure(send, counter, requests, iterations, warmup):
+    results = {}
+    for name, method, path, body in requests:
+        for _ in range(warmup):
+            send(method, path, body)
+
+        latencies = []
+        queries = []
+        for _ in range(iterations):
+            before = counter.count
+            started = time.perf_counter()
+            status, _ = send(method, path, body)
+            latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(counter.count - before)
+            if status != 200:
+                raise click.ClickException(f'{method} {path} returned {status}.')
+
+        results[name] = {
+            'method': method,
+            'path': path,
+            'requests': iterations,
+            'queries_per_request': max(queries),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            **{f'p{percent}_ms': round(percentile(latencies, percent), 3) for percent in PERCENTILES},
+        }
+    return results
+
+
+def _peak_allocations(send, requests):
+    peaks = {}
+    for name, method, path, body in requests:
+        tracemalloc.start()
+        try:
+            send(method, path, body)
+            peaks[name] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        finally:
+            tracemalloc.stop()
+    return peaks
+
+
+class _Server(threading.Thread):
+    def __init__(self, app):
+        super().__init__(daemon=True)
+        self.server = make_server('127.0.0.1', 0, app, threaded=False)
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.join()
+
+
+def _commit(path):
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=path,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(app, iterations=50, warmup=5, server=True, page_cache=False):
+    """Benchmark every route; returns the results as a JSON-serializable dict."""
+    app.config['WTF_CSRF_ENABLED'] = False
+    if not page_cache:
+        app.extensions['page_cache'].backend = cache.NullBackend()
+
+    requests = _bench_requests()
+    db.session.remove()
+    runners = {'client': _client_send(app.test_client())}
+    wsgi_server = None
+    if server:
+        wsgi_server = _Server(app)
+        wsgi_server.start()
+        runners['server'] = _server_send(wsgi_server.base_url)
+
+    results = {}
+    try:
+        # Read-only routes run their queries on the replicas, when there are any.
+        with QueryCounter(replicas.engines(app)) as counter:
+            for runner, send in runners.items():
+                results[runner] = _measure(send, counter, requests, iterations, warmup)
+        peaks = _peak_allocations(runners['client'], requests)
+    finally:
+        if wsgi_server is not None:
+            wsgi_server.stop()
+
+    routes = {}
+    for name, _, _, _ in requests:
+        routes[name] = {runner: measured[name] for runner, measured in results.items()}
+        routes[name]['peak_alloc_kib'] = peaks[name]
+
+    return {
+        'commit': _commit(app.root_path),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': db.engine.dialect.name,
+        'rows': {model.__tablename__: db.session.query(model).count() for model in (Artist, Venue, Show)},
+        'iterations': iterations,
+        'page_cache': page_cache,
+        # ru_maxrss is in KiB on Linux.
+        'max_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'routes': routes,
+    }
+
+
+# Run in a fresh interpreter; prints the timings of one cold start as JSON.
+STARTUP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+application.test_client().get('/')
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'total_ms': (served - started) * 1000,
+}))
+"""
+
+
+def startup(path, runs=10, config_name='production'):
+    """Cold start timings (p50 and max of `runs` fresh interpreters)."""
+    env = dict(os.environ, FYYUR_ENV=config_name)
+    env.setdefault('SECRET_KEY', 'bench')
+    # Started from `flask bench-startup`; the web workers being measured aren't.
+    env.pop('FLASK_RUN_FROM_CLI', None)
+
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT], cwd=path, env=env)
+        samples.append(json.loads(output.decode().strip().splitlines()[-1]))
+
+    return {
+        'commit': _commit(path),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': config_name,
+        'runs': runs,
+        'startup': {
+            metric: {
+                'p50_ms': round(percentile([sample[metric] for sample in samples], 50), 3),
+                'max_ms': round(max(sample[metric] for sample in samples), 3),
+            } for metric in samples[0]
+        },
+    }
+
+
+def compare(baseline, current, noise=NOISE):
+    """Yield (route, runner, metric, before, after) for every regression."""
+    for name, route in current['routes'].items():
+        before_route = baseline['routes'].get(name)
+        if before_route is None:
+            continue
+        for runner in ('client', 'server'):
+            before, after = before_route.get(runner), route.get(runner)
+            if not before or not after:
+                continue
+            if after['queries_per_request'] > before['queries_per_request']:
+                yield name, runner, 'queries_per_request', before['queries_per_request'], \
+                    after['queries_per_request']
+            for percent in PERCENTILES:
+                metric = f'p{percent}_ms'
+                if after[metric] > before[metric] * (1 + noise):
+                    yield name, runner, metric, before[metric], after[metric]
+
+
+@click.command('bench')
+@click.option('--iterations', default=50, show_default=True, help='Measured requests per route.')
+@click.option('--warmup', default=5, show_default=True, help='Unmeasured requests per route.')
+@click.option('--server/--no-server', default=True, show_default=True,
+              help='Also run the routes over HTTP against a local WSGI server.')
+@click.option('--page-cache/--no-page-cache', default=False, show_default=True,
+              help='Keep the page cache on (measures cache hits rather than rendering).')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True),
+              help='Write the results to this JSON file.')
+@with_appcontext
+def bench_command(iterations, warmup, server, page_cache, output):
+    """Benchmark every read route against the configured (seeded) database."""
+    results = run(current_app._get_current_object(), iterations, warmup, server, page_cache)
+
+    for name, route in results['routes'].items():
+        for runner in ('client', 'server'):
+            if runner in route:
+                measured = route[runner]
+                click.echo(f"{name:20} {runner:6} p50 {measured['p50_ms']:8.2f} ms  "
+                           f"p95 {measured['p95_ms']:8.2f} ms  p99 {measured['p99_ms']:8.2f} ms  "
+                           f"{measured['queries_per_request']:3} queries")
+    click.echo(f"max RSS {results['max_rss_kib'] / 1024:.1f} MiB")
+
+    if output:
+        with open(output, 'w') as results_file:
+            json.dump(results, results_file, indent=2, sort_keys=True)
+        click.echo(f'Wrote {output}.')
+
+
+@click.command('bench-compare')
+@click.argument('baseline', type=click.File())
+@click.argument('current', type=click.File())
+@click.option('--noise', default=NOISE, show_default=True,
+              help='Relative latency increase ignored as noise.')
+def bench_compare_command(baseline, current, noise):
+    """Compare two `flask bench` result files and fail on regressions."""
+    baseline, current = json.load(baseline), json.load(current)
+    regressions = list(compare(baseline, current, noise))
+    for name, runner, metric, before, after in regressions:
+        click.echo(f'{name} ({runner}) {metric}: {before} -> {after}')
+    if regressions:
+        raise click.ClickException(
+            f"{len(regressions)} regressions from {baseline.get('commit')} to {current.get('commit')}.")
+    click.echo('No regressions.')
+
+
+@click.command('bench-startup')
+@click.option('--runs', default=10, show_default=True, help='Fresh interpreters to start.')
+@click.option('--config', 'config_name', default='production', show_default=True,
+              help='Config profile the app is built with.')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True),
+              help='Write the results to this JSON file.')
+@with_appcontext
+def bench_startup_command(runs, config_name, output):
+    """Measure cold starts: import, create_app() and the first request."""
+    results = startup(current_app.root_path, runs, config_name)
+    for metric, measured in results['startup'].items():
+        click.echo(f"{metric:18} p50 {measured['p50_ms']:8.2f} ms  max {measured['max_ms']:8.2f} ms")
+
+    if output:
+        with open(output, 'w') as results_file:
+            json.dump(results, results_file, indent=2, sort_keys=True)
+        click.echo(f'Wrote {output}.')
+
+
+def init_app(app):
+    app.cli.add_command(bench_command)
+    app.cli.add_command(bench_compare_command)
+    app.cli.add_command(bench_startup_command)
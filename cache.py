@@ -0,0 +1,207 @@
+"""Rendered page cache with tag-based invalidation.
+
+Every cached page is tagged (e.g. 'artists' for the listing, 'artist:4' for
+a detail page). Each tag has a generation number that is part of the cache
+key, so invalidating a tag bumps its generation and every page rendered
+under the old one simply stops being looked up and ages out of the backend.
+Views that are also conditional() include their version (the ETag) in the
+key, so changes made by other processes are picked up without invalidation.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from threading import Lock
+
+from flask import current_app, g, make_response, request, session
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+    def generations(self, tags):
+        return [0] * len(tags)
+
+    def bump(self, tags):
+        pass
+
+
+class LRUBackend:
+    """In-process LRU with per-entry expiry.
+
+    Tag generations are kept apart from the LRU entries: evicting one would
+    reset it and could resurrect a page cached under an older generation.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generations(self, tags):
+        with self._lock:
+            return [self._generations.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+
+class RedisBackend:
+    """Any Redis-compatible server, shared by every worker process."""
+
+    def __init__(self, url, prefix='fyyur:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('PAGE_CACHE_BACKEND = "redis" requires the redis package') from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, timeout):
+        self.client.set(self.prefix + key, value, px=int(timeout * 1000))
+
+    def generations(self, tags):
+        values = self.client.mget([f'{self.prefix}tag:{tag}' for tag in tags])
+        return [int(value or 0) for value in values]
+
+    def bump(self, tags):
+        pipeline = self.client.pipeline()
+        for tag in tags:
+            pipeline.incr(f'{self.prefix}tag:{tag}')
+        pipeline.execute()
+
+
+class PageCache:
+    def __init__(self, backend, timeout):
+        self.backend = backend
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.lookup_time = 0.0
+
+    def key(self, tags):
+        generations = self.backend.generations(tags)
+        versions = ','.join(f'{tag}={generation}' for tag, generation in zip(tags, generations))
+        query = '&'.join(sorted(request.query_string.decode().split('&')))
+        # Under conditional(), the body is keyed by the version its ETag is
+        # computed from, so the two can't disagree: once the data changes,
+        # pages rendered from the old data are no longer looked up.
+        etag = g.get('etag', '')
+        return f'page:{request.path}?{query}|{versions}|{etag}'
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'avg_lookup_ms': round(self.lookup_time / lookups * 1000, 3) if lookups else None,
+        }
+
+
+def _page_cache():
+    return current_app.extensions['page_cache']
+
+
+def expire_at(when):
+    """Cap the lifetime of the page being rendered, e.g. at the next show start."""
+    if when is not None and (g.get('page_expires_at') is None or when < g.page_expires_at):
+        g.page_expires_at = when
+
+
+def cached_page(*tags):
+    """Cache the rendered GET response of a view under the given tags.
+
+    Tags are formatted with the view arguments, so 'artist:{artist_id}' tags
+    each artist page separately. Requests with pending flash messages bypass
+    the cache in both directions.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = _page_cache()
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            started = time.perf_counter()
+            key = cache.key([tag.format(**kwargs) for tag in tags])
+            # A client that has just written renders from the primary and
+            # replaces what a lagging replica may have put in the cache.
+            body = None if g.get('read_your_writes') else cache.backend.get(key)
+            cache.lookup_time += time.perf_counter() - started
+
+            if body is not None:
+                cache.hits += 1
+                response = make_response(body)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            cache.misses += 1
+            response = make_response(view(*args, **kwargs))
+            # A page read from a replica is only stored under the version that
+            # replica reported (g.etag): one lagging behind then fills the key
+            # of the old version, never the current one. Without a version
+            # the key can't tell, so such pages aren't stored.
+            storable = g.get('etag') or not g.get('db_replica')
+            if response.status_code == 200 and storable:
+                timeout = cache.timeout
+                expires_at = g.get('page_expires_at')
+                if expires_at is not None:
+                    timeout = min(timeout, (expires_at - datetime.now()).total_seconds())
+                if timeout > 0:
+                    cache.backend.set(key, response.get_data(), timeout)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate(*tags):
+    if tags:
+        _page_cache().backend.bump(tags)
+
+
+def init_app(app):
+    backend = app.config.get('PAGE_CACHE_BACKEND', 'lru')
+    if backend == 'lru':
+        backend = LRUBackend(app.config.get('PAGE_CACHE_MAX_ENTRIES', 1024))
+    elif backend == 'redis':
+        backend = RedisBackend(app.config['PAGE_CACHE_URL'])
+    elif backend in (None, 'null'):
+        backend = NullBackend()
+    else:
+        raise ValueError(f'Unknown PAGE_CACHE_BACKEND {backend!r}')
+
+    cache = PageCache(backend, app.config.get('PAGE_CACHE_TIMEOUT', 300))
+    app.extensions['page_cache'] = cache
+    app.extensions.setdefault('perf_metrics', {})['page_cache'] = cache.stats
@@ -0,0 +1,362 @@
+"""Calendar views: shows in a date range, and iCalendar feeds.
+
+`GET /venues/<id>/calendar`, `/artists/<id>/calendar` and
+`/calendar?city=..&state=..` list the shows that overlap [start, end)
+(dates or times, at most MAX_RANGE_DAYS apart; the next 30 days by
+default). No show runs longer than MAX_SHOW_DURATION, so this is one
+bounded range scan of the (venue_id, start_time), (artist_id,
+start_time) or start_time index, and only touches the partitions of the
+range.
+
+`GET /venues/<id>/calendar.ics` and `/artists/<id>/calendar.ics` are
+feeds of the shows from FEED_PAST_DAYS back onwards. Calendar clients
+poll them, so:
+- the feed's version (one aggregate query) answers If-None-Match and
+  If-Modified-Since with 304;
+- the last feed built in this process is served again while its version
+  holds;
+- otherwise it is rebuilt reusing the VEVENT of every show and
+  counterpart that hasn't changed since, so only new or edited shows are
+  rendered.
+"""
+import threading
+from collections import OrderedDict
+from datetime import MAXYEAR, MINYEAR, datetime, timedelta
+
+from flask import Blueprint, abort, current_app, g, jsonify, make_response, request, url_for
+from sqlalchemy import and_, func
+
+import conditional
+import profiling
+import replicas
+from models import db, Artist, MAX_SHOW_DURATION, Show, Venue
+from scheduling import parse_time
+
+MAX_RANGE_DAYS = 92
+DEFAULT_RANGE_DAYS = 30
+FEED_PAST_DAYS = 90
+# A year of margin keeps the range and its overlap scan (see
+# shows_between) within what datetime can hold.
+EARLIEST = datetime(MINYEAR + 1, 1, 1)
+LATEST = datetime(MAXYEAR - 1, 12, 31)
+PRODID = '-//Fyyur//Shows//EN'
+
+bp = Blueprint('calendars', __name__)
+
+# (model, foreign key of its shows, counterpart, counterpart's key in shows)
+FEEDS = {
+    'venue': (Venue, Show.venue_id, Artist, Show.artist_id),
+    'artist': (Artist, Show.artist_id, Venue, Show.venue_id),
+}
+
+
+class FeedCache:
+    """Per-process LRU of built feeds, and of the VEVENTs they are made of."""
+
+    def __init__(self, max_feeds=256, max_events=50000):
+        self.max_feeds = max_feeds
+        self.max_events = max_events
+        self._feeds = OrderedDict()
+        self._events = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, entries, key):
+        with self._lock:
+            value = entries.get(key)
+            if value is not None:
+                entries.move_to_end(key)
+            return value
+
+    def _set(self, entries, key, value, max_entries):
+        with self._lock:
+            entries[key] = value
+            entries.move_to_end(key)
+            while len(entries) > max_entries:
+                entries.popitem(last=False)
+
+    def feed(self, key):
+        return self._get(self._feeds, key)
+
+    def set_feed(self, key, value):
+        self._set(self._feeds, key, value, self.max_feeds)
+
+    def event(self, key):
+        return self._get(self._events, key)
+
+    def set_event(self, key, value):
+        self._set(self._events, key, value, self.max_events)
+
+    def stats(self):
+        return {'feeds': len(self._feeds), 'events': len(self._events)}
+
+
+def _parse_bound(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    value = value.strip()
+    if len(value) == 10:
+        value += ' 00:00'
+    value = parse_time(value)
+    if not EARLIEST <= value <= LATEST:
+        raise ValueError(f'{name} must be between {EARLIEST.date()} and {LATEST.date()}.')
+    return value
+
+
+def requested_range():
+    """The [start, end) of the request; raises ValueError for a bad one."""
+    start = _parse_bound('start', datetime.combine(datetime.now().date(), datetime.min.time()))
+    end = _parse_bound('end', None) or start + timedelta(days=DEFAULT_RANGE_DAYS)
+    if end <= start:
+        raise ValueError('end must be after start.')
+    if end - start > timedelta(days=MAX_RANGE_DAYS):
+        raise ValueError(f'At most {MAX_RANGE_DAYS} days at a time.')
+    return start, end
+
+
+def shows_between(start, end, venue_id=None, artist_id=None, city=None, state=None):
+    """The shows overlapping [start, end), in start order."""
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.end_time,
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Venue.city,
+        Venue.state
+    ).join(Artist, Artist.id == Show.artist_id).join(Venue, Venue.id == Show.venue_id).filter(
+        Show.start_time >= start - MAX_SHOW_DURATION,
+        Show.start_time < end,
+        Show.end_time > start
+    )
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    if city:
+        query = query.filter(Venue.city == city)
+    if state:
+        query = query.filter(Venue.state == state)
+    return query.order_by(Show.start_time, Show.id).all()
+
+
+def _range_response(**filters):
+    try:
+        start, end = requested_range()
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    response = jsonify(
+        start=start.isoformat(),
+        end=end.isoformat(),
+        shows=[{
+            'id': show.id,
+            'start_time': show.start_time.isoformat(),
+            'end_time': show.end_time.isoformat(),
+            'artist_id': show.artist_id,
+            'artist_name': show.artist_name,
+            'venue_id': show.venue_id,
+            'venue_name': show.venue_name,
+            'city': show.city,
+            'state': show.state,
+        } for show in shows_between(start, end, **filters)]
+    )
+    response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def _exists(model, entity_id):
+    if db.session.query(model.id).filter(model.id == entity_id).first() is None:
+        abort(404)
+
+
+@bp.route('/venues/<int:venue_id>/calendar')
+@replicas.read_only
+@profiling.query_budget(2)
+def venue_calendar(venue_id):
+    _exists(Venue, venue_id)
+    return _range_response(venue_id=venue_id)
+
+
+@bp.route('/artists/<int:artist_id>/calendar')
+@replicas.read_only
+@profiling.query_budget(2)
+def artist_calendar(artist_id):
+    _exists(Artist, artist_id)
+    return _range_response(artist_id=artist_id)
+
+
+@bp.route('/calendar')
+@replicas.read_only
+@profiling.query_budget(1)
+def city_calendar():
+    if not request.args.get('city'):
+        return jsonify(error='Pass the city (and state) to list.'), 400
+    return _range_response(city=request.args['city'], state=request.args.get('state'))
+
+
+# iCalendar feeds
+
+
+def _feed_start(now=None):
+    # Whole days, so a feed's version only moves with the window once a day.
+    today = (now or datetime.now()).date()
+    return datetime.combine(today - timedelta(days=FEED_PAST_DAYS), datetime.min.time())
+
+
+def _feed_version(kind):
+    model, foreign_key, counterpart, counterpart_key = FEEDS[kind]
+
+    def version(**kwargs):
+        entity_id = kwargs[f'{kind}_id']
+        row = db.session.query(
+            model.updated_at,
+            func.count(Show.id),
+            func.max(Show.updated_at),
+            func.max(counterpart.updated_at)
+        ).outerjoin(
+            Show, and_(foreign_key == model.id, Show.start_time >= _feed_start())
+        ).outerjoin(
+            counterpart, counterpart.id == counterpart_key
+        ).filter(model.id == entity_id).group_by(model.id).first()
+        if row is None:
+            return None
+        updated_at, shows, shows_updated_at, counterparts_updated_at = row
+        return ([kind, entity_id, _feed_start(), updated_at, shows, shows_updated_at, counterparts_updated_at],
+                conditional._latest(updated_at, shows_updated_at, counterparts_updated_at))
+    return version
+
+
+def escape_text(value):
+    return (str(value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Split a content line into lines of at most 75 octets (RFC 5545, 3.1)."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Don't split a UTF-8 sequence.
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+        limit = 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _ical_time(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def _vevent(show):
+    location = ', '.join(part for part in (show.venue_name, show.address, show.city, show.state) if part)
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:show-{show.id}@{request.host}',
+        # updated_at is UTC; the show times are local wall-clock times.
+        f'DTSTAMP:{_ical_time(show.updated_at)}Z',
+        f'DTSTART:{_ical_time(show.start_time)}',
+        f'DTEND:{_ical_time(show.end_time)}',
+        f'SUMMARY:{escape_text(f"{show.artist_name} at {show.venue_name}")}',
+        f'LOCATION:{escape_text(location)}',
+        f"URL:{url_for('venues.show_venue', venue_id=show.venue_id, _external=True)}",
+        'END:VEVENT',
+    ]
+    return ''.join(fold(line) for line in lines)
+
+
+def _feed_cache():
+    return current_app.extensions['feed_cache']
+
+
+def _build_feed(kind, entity_id):
+    model, foreign_key, counterpart, counterpart_key = FEEDS[kind]
+    entity = db.session.query(model.name).filter(model.id == entity_id).first()
+    if entity is None:
+        abort(404)
+
+    rows = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.end_time,
+        Show.updated_at,
+        Artist.name.label('artist_name'),
+        Artist.updated_at.label('artist_updated_at'),
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Venue.address,
+        Venue.city,
+        Venue.state,
+        Venue.updated_at.label('venue_updated_at')
+    ).join(Artist, Artist.id == Show.artist_id).join(Venue, Venue.id == Show.venue_id).filter(
+        foreign_key == entity_id,
+        Show.start_time >= _feed_start()
+    ).order_by(Show.start_time, Show.id)
+
+    cache = _feed_cache()
+    events = []
+    for show in rows:
+        # A show's VEVENT changes with the show, its artist or its venue.
+        key = (request.host, show.id, show.updated_at, show.artist_updated_at, show.venue_updated_at)
+        event = cache.event(key)
+        if event is None:
+            event = _vevent(show)
+            cache.set_event(key, event)
+        events.append(event)
+
+    header = ''.join(fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(entity.name)}',
+    ])
+    return header + ''.join(events) + 'END:VCALENDAR\r\n'
+
+
+def _feed_response(kind, entity_id):
+    key = (request.host, kind, entity_id)
+    cache = _feed_cache()
+    cached = cache.feed(key)
+    if cached is not None and cached[0] == g.get('etag'):
+        body = cached[1]
+    else:
+        body = _build_feed(kind, entity_id)
+        if g.get('etag'):
+            cache.set_feed(key, (g.etag, body))
+    response = make_response(body)
+    response.mimetype = 'text/calendar'
+    return response
+
+
+@bp.route('/venues/<int:venue_id>/calendar.ics')
+@replicas.read_only
+@profiling.query_budget(3)
+@conditional.conditional(_feed_version('venue'))
+def venue_feed(venue_id):
+    return _feed_response('venue', venue_id)
+
+
+@bp.route('/artists/<int:artist_id>/calendar.ics')
+@replicas.read_only
+@profiling.query_budget(3)
+@conditional.conditional(_feed_version('artist'))
+def artist_feed(artist_id):
+    return _feed_response('artist', artist_id)
+
+
+def init_app(app):
+    cache = FeedCache()
+    app.extensions['feed_cache'] = cache
+    app.extensions.setdefault('perf_metrics', {})['feed_cache'] = cache.stats
+    app.register_blueprint(bp)
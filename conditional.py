@@ -0,0 +1,109 @@
+"""Conditional GET (ETag / Last-Modified / 304) for the read pages.
+
+Versions are computed from the `updated_at` columns with one aggregate
+query, before and instead of rendering the page.
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from flask import g, make_response, request, session
+from sqlalchemy import case, func
+
+from models import db, Artist, Match, Show, Venue
+
+
+def _latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def _detail_version(kind, model, foreign_key, counterpart, counterpart_key, entity_id):
+    # Pages partition shows into past and upcoming by the current time, so
+    # the number of upcoming shows is part of the version as well. No
+    # timestamp moves when a show starts, so these pages get no
+    # Last-Modified, and If-Modified-Since alone never answers 304.
+    now = datetime.now()
+    # Suggestions are refreshed by the worker (see matches.py).
+    suggestions = db.session.query(Match.rank).filter(Match.kind == kind, Match.owner_id == entity_id)
+    row = db.session.query(
+        model.updated_at,
+        func.count(Show.id),
+        func.max(Show.updated_at),
+        func.max(counterpart.updated_at),
+        func.sum(case([(Show.start_time >= now, 1)], else_=0)),
+        suggestions.with_entities(func.count(Match.rank)).as_scalar(),
+        suggestions.with_entities(func.max(Match.computed_at)).as_scalar()
+    ).outerjoin(
+        Show, foreign_key == model.id
+    ).outerjoin(
+        counterpart, counterpart.id == counterpart_key
+    ).filter(model.id == entity_id).group_by(model.id).first()
+
+    if row is None:
+        return None
+    updated_at, shows, shows_updated_at, counterparts_updated_at, upcoming, matches, matched_at = row
+    parts = [entity_id, updated_at, shows, shows_updated_at, counterparts_updated_at, upcoming, matches, matched_at]
+    return parts, None
+
+
+def artist_version(artist_id):
+    return _detail_version('artist', Artist, Show.artist_id, Venue, Show.venue_id, artist_id)
+
+
+def venue_version(venue_id):
+    return _detail_version('venue', Venue, Show.venue_id, Artist, Show.artist_id, venue_id)
+
+
+def listing_version(*models):
+    """Version of a listing over `models`; rows are never deleted, so the
+    newest `updated_at` and highest id of each table identify its state."""
+    columns = []
+    for model in models:
+        columns.append(db.session.query(func.max(model.updated_at)).as_scalar())
+        columns.append(db.session.query(func.max(model.id)).as_scalar())
+    row = db.session.query(*columns).one()
+    return list(row), _latest(*row[::2])
+
+
+def etag(parts):
+    payload = repr([request.path, request.query_string.decode()] + list(parts))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def conditional(version):
+    """Answer If-None-Match / If-Modified-Since with 304 without rendering.
+
+    `version` is called with the view arguments and returns (parts,
+    last_modified), or None to skip conditional handling (e.g. a missing
+    entity the view will 404 on).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            current = version(**kwargs)
+            if current is None:
+                return view(*args, **kwargs)
+            parts, last_modified = current
+            tag = etag(parts)
+            # Views that cache what they render key it on the version, so a
+            # cached body is always the one this ETag stands for.
+            g.etag = tag
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(tag)
+            else:
+                not_modified = (last_modified is not None and request.if_modified_since is not None
+                                and last_modified.replace(microsecond=0) <= request.if_modified_since)
+
+            response = make_response('', 304) if not_modified else make_response(view(*args, **kwargs))
+            response.set_etag(tag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, func, select
+
+import partitions
+from models import db, Artist, Show, Venue
+
+
+def _refresh(model, foreign_key, ids, now):
+    upcoming = select([func.count(Show.id)]).where(
+        and_(foreign_key == model.id, partitions.upcoming(now))).as_scalar()
+    past = select([func.count(Show.id)]).where(
+        and_(foreign_key == model.id, partitions.past(now))).as_scalar()
+
+    # Bumping updated_at moves the versions of the pages showing the
+    # counters, and so their ETags and page cache keys, in every process.
+    statement = model.__table__.update().values(
+        upcoming_shows_count=upcoming,
+        past_shows_count=past,
+        updated_at=datetime.utcnow()
+    )
+    if ids is not None:
+        if not ids:
+            return
+        statement = statement.where(model.id.in_(ids))
+    db.session.execute(statement)
+
+
+def refresh_counters(artist_ids=None, venue_ids=None, now=None):
+    """Recompute the show counters of the given artists and venues.
+
+    Passing None refreshes every row. The caller owns the transaction.
+    """
+    now = now or datetime.now()
+    _refresh(Artist, Show.artist_id, artist_ids, now)
+    _refresh(Venue, Show.venue_id, venue_ids, now)
+
+
+def rollover_counters(window, now=None):
+    """Refresh the counters of everyone with a show that started within `window`.
+
+    Run more often than `window` so no show that moved from upcoming to past is
+    missed; refreshing is idempotent, so overlapping runs are harmless.
+    """
+    now = now or datetime.now()
+    started = and_(Show.start_time >= now - window, Show.start_time < now)
+
+    artist_ids = [row[0] for row in db.session.query(Show.artist_id).filter(started).distinct()]
+    venue_ids = [row[0] for row in db.session.query(Show.venue_id).filter(started).distinct()]
+    refresh_counters(artist_ids=artist_ids, venue_ids=venue_ids, now=now)
+    return len(artist_ids), len(venue_ids)
+
+
+@click.command('backfill-counters')
+@with_appcontext
+def backfill_counters_command():
+    """Recompute the show counters of every artist and venue."""
+    refresh_counters()
+    db.session.commit()
+    click.echo('Show counters backfilled.')
+
+
+@click.command('rollover-counters')
+@click.option('--window', default=60, show_default=True,
+              help='Minutes to look back for shows that have started.')
+@with_appcontext
+def rollover_counters_command(window):
+    """Move shows that have started from the upcoming to the past counters."""
+    artists, venues = rollover_counters(timedelta(minutes=window))
+    db.session.commit()
+    click.echo(f'Refreshed counters of {artists} artists and {venues} venues.')
+
+
+def init_app(app):
+    app.cli.add_command(backfill_counters_command)
+    app.cli.add_command(rollover_counters_command)
@@ -0,0 +1,98 @@
+from collections import namedtuple
+from datetime import datetime
+
+import partitions
+from models import db, genre_names, Artist, Match, Show, Venue
+
+Detail = namedtuple('Detail', 'entity genres past_shows upcoming_shows next_show_at')
+
+
+def _shows(rows, prefix):
+    return [{
+        f'{prefix}_id': counterpart_id,
+        f'{prefix}_name': counterpart_name,
+        'image_link': image_link,
+        'start_time': str(start_time)
+    } for start_time, counterpart_id, counterpart_name, image_link in rows if start_time is not None]
+
+
+def _load_detail(model, foreign_key, counterpart, counterpart_key, prefix, entity_id, now):
+    # Upcoming shows come with the entity and its genres; bounded by start_time,
+    # they only touch the current and future partitions of shows. The past
+    # shows are a second round trip, which keeps the outer join off the old
+    # partitions.
+    rows = db.session.query(
+        model,
+        genre_names(model),
+        Show.start_time,
+        counterpart.id,
+        counterpart.name,
+        counterpart.image_link
+    ).outerjoin(
+        Show, db.and_(foreign_key == model.id, partitions.upcoming(now))
+    ).outerjoin(
+        counterpart, counterpart.id == counterpart_key
+    ).filter(model.id == entity_id).order_by(Show.start_time, Show.id).all()
+
+    if not rows:
+        return None
+
+    past_rows = db.session.query(
+        Show.start_time,
+        counterpart.id,
+        counterpart.name,
+        counterpart.image_link
+    ).join(
+        counterpart, counterpart.id == counterpart_key
+    ).filter(foreign_key == entity_id, partitions.past(now)).order_by(Show.start_time, Show.id).all()
+
+    entity, genres = rows[0][:2]
+    return Detail(
+        entity,
+        sorted(genres.split(',')) if genres else [],
+        _shows(past_rows, prefix),
+        _shows([row[2:] for row in rows], prefix),
+        rows[0].start_time
+    )
+
+
+def load_artist(artist_id, now=None):
+    """The artist with the venues of its past and upcoming shows, in two queries.
+
+    The upcoming shows are loaded with the artist and its genres, the past
+    shows separately (see _load_detail). Returns a Detail, or None if there is no such artist. Shows starting at
+    or after `now` are upcoming; `next_show_at` is the first of them.
+    """
+    return _load_detail(Artist, Show.artist_id, Venue, Show.venue_id, 'venue',
+                        artist_id, now or datetime.now())
+
+
+def load_venue(venue_id, now=None):
+    """The venue with the artists of its past and upcoming shows, in two queries.
+
+    The upcoming shows are loaded with the venue and its genres, the past
+    shows separately (see _load_detail). Returns a Detail, or None if there is no such venue. Shows starting at
+    or after `now` are upcoming; `next_show_at` is the first of them.
+    """
+    return _load_detail(Venue, Show.venue_id, Artist, Show.artist_id, 'artist',
+                        venue_id, now or datetime.now())
+
+
+def suggested(kind, owner_id):
+    """The stored matches of an artist ('artist') or venue ('venue'), best first.
+
+    Read here rather than in matches.py, so the pages don't load NumPy.
+    """
+    other, model = ('venue', Venue) if kind == 'artist' else ('artist', Artist)
+    rows = db.session.query(
+        model.id, model.name, model.image_link, model.city, model.state, Match.score
+    ).join(Match, Match.match_id == model.id).filter(
+        Match.kind == kind, Match.owner_id == owner_id).order_by(Match.rank)
+    return [{
+        f'{other}_id': match_id,
+        f'{other}_name': name,
+        'image_link': image_link,
+        'city': city,
+        'state': state,
+        'score': score,
+    } for match_id, name, image_link, city, state, score in rows]
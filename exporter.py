@@ -0,0 +1,186 @@
+"""Streaming export of the booking catalogue.
+
+Tables are read through a server-side cursor in batches and every batch is
+serialized, optionally compressed, and handed on before the next one is
+fetched, so memory stays flat however large the tables are.
+
+Formats: csv, ndjson and parquet (columnar, one row group per batch; needs
+the optional pyarrow package).
+"""
+import csv
+import io
+import zlib
+from datetime import datetime
+from itertools import islice
+
+import click
+from flask import Blueprint, Response, abort, request, stream_with_context
+from flask.cli import with_appcontext
+
+from models import db, genre_names, Artist, Show, Venue
+from streaming import BATCH_SIZE, dumps, stream
+
+bp = Blueprint('exporter', __name__)
+
+
+def _table_columns(model):
+    columns = [(column.name, getattr(model, column.key)) for column in model.__table__.columns
+               if column.name not in ('search_text', 'geo_cell')]
+    if model in (Artist, Venue):
+        columns.append(('genres', genre_names(model)))
+    return columns
+
+
+def _prefixed(prefix, model):
+    # The show row already has the id, and only the show's updated_at is kept.
+    return [(f'{prefix}_{name}', column.label(f'{prefix}_{name}'))
+            for name, column in _table_columns(model) if name not in ('id', 'updated_at')]
+
+
+DATASETS = {
+    'artists': lambda: (_table_columns(Artist), Artist.id, None),
+    'venues': lambda: (_table_columns(Venue), Venue.id, None),
+    'shows': lambda: (_table_columns(Show), Show.id, None),
+    # One row per show with its artist and venue, for analytics.
+    'bookings': lambda: (
+        _table_columns(Show) + _prefixed('artist', Artist) + _prefixed('venue', Venue),
+        Show.id,
+        lambda query: query.select_from(Show).join(Artist, Artist.id == Show.artist_id).join(
+            Venue, Venue.id == Show.venue_id)
+    ),
+}
+
+
+def _batches(dataset, batch_size):
+    columns, order, join = DATASETS[dataset]()
+    query = db.session.query(*[column for _, column in columns])
+    if join is not None:
+        query = join(query)
+    rows = iter(stream(query.order_by(order), batch_size))
+    names = [name for name, _ in columns]
+    return names, [column for _, column in columns], iter(lambda: list(islice(rows, batch_size)), [])
+
+
+def _csv(names, columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _ndjson(names, columns, batches):
+    for batch in batches:
+        yield ''.join(dumps(dict(zip(names, row))) + '\n' for row in batch).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _parquet(names, columns, batches):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('Parquet export requires the pyarrow package.')
+
+    types = {int: pa.int64(), bool: pa.bool_(), float: pa.float64(), datetime: pa.timestamp('us')}
+    schema = pa.schema([(name, types.get(column.type.python_type, pa.string()))
+                        for name, column in zip(names, columns)])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for batch in batches:
+        arrays = [pa.array([row[index] for row in batch], type=field.type)
+                  for index, field in enumerate(schema)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+FORMATS = {
+    'csv': (_csv, 'text/csv'),
+    'ndjson': (_ndjson, 'application/x-ndjson'),
+    'parquet': (_parquet, 'application/vnd.apache.parquet'),
+}
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export(dataset, file_format, compress=False, batch_size=BATCH_SIZE):
+    """Yield the encoded `dataset` in `file_format` chunk by chunk."""
+    serialize, _ = FORMATS[file_format]
+    chunks = serialize(*_batches(dataset, batch_size))
+    return gzipped(chunks) if compress else chunks
+
+
+@bp.route('/export/<any(artists, venues, shows, bookings):dataset>.<any(csv, ndjson, parquet):file_format>')
+def export_download(dataset, file_format):
+    if file_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            abort(501)
+
+    # Parquet pages are compressed already.
+    compress = file_format != 'parquet' and 'gzip' in request.accept_encodings
+    response = Response(stream_with_context(export(dataset, file_format, compress)),
+                        mimetype=FORMATS[file_format][1])
+    response.headers['Content-Disposition'] = f'attachment; filename={dataset}.{file_format}'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@click.command('export')
+@click.argument('dataset', type=click.Choice(sorted(DATASETS)))
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'file_format', type=click.Choice(sorted(FORMATS)), default='csv',
+              show_default=True)
+@click.option('--gzip', 'compress', is_flag=True,
+              help='Compress the output; implied by a .gz path.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+@with_appcontext
+def export_command(dataset, path, file_format, compress, batch_size):
+    """Stream a table, or the denormalized bookings, to a file."""
+    compress = compress or path.endswith('.gz')
+    size = 0
+    with open(path, 'wb') as output:
+        for chunk in export(dataset, file_format, compress, batch_size):
+            output.write(chunk)
+            size += len(chunk)
+    click.echo(f'Exported {dataset} to {path} ({size} bytes).')
+
+
+def init_app(app):
+    app.register_blueprint(bp)
+    app.cli.add_command(export_command)
@@ -13,6 +13,11 @@ def test():
         abort("Aborted at user request.")
 
 
+def bench():
+    local("mkdir -p benchmarks")
+    local("flask bench --output benchmarks/$(git rev-parse --short HEAD).json")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -1,7 +1,7 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
-from wtforms.validators import DataRequired, AnyOf, URL, Regexp
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, Regexp, NumberRange, Optional
 
 
 class ShowForm(Form):
@@ -16,6 +16,11 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1, max=720)],
+        default=120
+    )
 
 class VenueForm(Form):
     name = StringField(
@@ -124,8 +129,8 @@ class VenueForm(Form):
         'seeking_talent',
         validators=[DataRequired()],
         choices=[
-            (True, True),
-            (False, False)
+            ('True', 'True'),
+            ('False', 'False')
         ]
     )
     seeking_description = StringField(
@@ -237,8 +242,8 @@ class ArtistForm(Form):
         'seeking_venue',
         validators=[DataRequired()],
         choices=[
-            True,
-            False
+            ('True', 'True'),
+            ('False', 'False')
         ]
     )
     seeking_description = StringField(
@@ -0,0 +1,100 @@
+"""Offline geocoding and the grid index for venue locations.
+
+Venues are located with a local gazetteer, data/gazetteer.csv (or the
+file GAZETTEER_PATH points to), never a network service. Its rows are
+`city,state,zip,latitude,longitude`: rows with a zip give that ZIP
+code's centroid, used when the address ends in it, the others a city's
+centroid. The bundled file has the centroids of the larger US cities, so
+out of the box venues are placed by city; append ZIP rows for more
+precision.
+
+Each located venue also gets a cell of a GRID_DEGREES grid. The cells
+are numbered row by row, so the cells of a bounding box are one range of
+ids per grid row, and a radius search is a few range scans of an index
+on the cell column on any database.
+"""
+import csv
+import math
+import os
+import re
+from functools import lru_cache
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+GRID_DEGREES = 0.1
+GRID_COLUMNS = int(360 / GRID_DEGREES)
+
+GAZETTEER_PATH = os.environ.get(
+    'GAZETTEER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.csv'))
+
+_ZIP = re.compile(r'\b(\d{5})(?:-\d{4})?\s*$')
+
+
+def _city_key(city, state):
+    return ' '.join((city or '').replace('.', '').lower().split()), (state or '').strip().upper()
+
+
+@lru_cache(maxsize=1)
+def gazetteer():
+    """(cities, zips): coordinates by (city, state) and by ZIP code."""
+    cities = {}
+    zips = {}
+    with open(GAZETTEER_PATH, newline='') as gazetteer_file:
+        for row in csv.DictReader(gazetteer_file):
+            point = (float(row['latitude']), float(row['longitude']))
+            if row.get('zip'):
+                zips[row['zip']] = point
+            else:
+                cities[_city_key(row['city'], row['state'])] = point
+    return cities, zips
+
+
+def locate(address=None, city=None, state=None):
+    """(latitude, longitude) of an address, or None if the gazetteer doesn't know it."""
+    cities, zips = gazetteer()
+    match = _ZIP.search(address or '')
+    if match and match[1] in zips:
+        return zips[match[1]]
+    return cities.get(_city_key(city, state))
+
+
+def cell(latitude, longitude):
+    row = min(int((latitude + 90) / GRID_DEGREES), int(180 / GRID_DEGREES) - 1)
+    column = min(int((longitude + 180) / GRID_DEGREES), GRID_COLUMNS - 1)
+    return row * GRID_COLUMNS + column
+
+
+def location(address=None, city=None, state=None):
+    """latitude, longitude and geo_cell column values for a venue."""
+    point = locate(address, city, state)
+    if point is None:
+        return {'latitude': None, 'longitude': None, 'geo_cell': None}
+    return {'latitude': point[0], 'longitude': point[1], 'geo_cell': cell(*point)}
+
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    """Great-circle (haversine) distance."""
+    phi, other_phi = math.radians(latitude), math.radians(other_latitude)
+    a = (math.sin((other_phi - phi) / 2) ** 2
+         + math.cos(phi) * math.cos(other_phi) * math.sin(math.radians(other_longitude - longitude) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(south, west, north, east) around everything within `radius_km`."""
+    latitude_delta = radius_km / KM_PER_DEGREE
+    south, north = max(-90.0, latitude - latitude_delta), min(90.0, latitude + latitude_delta)
+    narrowest = max(abs(south), abs(north))
+    if narrowest >= 89.9:
+        return south, -180.0, north, 180.0
+    longitude_delta = min(180.0, radius_km / (KM_PER_DEGREE * math.cos(math.radians(narrowest))))
+    # Doesn't wrap around the antimeridian; clipped there instead.
+    return south, max(-180.0, longitude - longitude_delta), north, min(180.0, longitude + longitude_delta)
+
+
+def cell_ranges(south, west, north, east):
+    """(first, last) cell ids of each grid row of a bounding box."""
+    first_column, last_column = cell(0, west) % GRID_COLUMNS, cell(0, east) % GRID_COLUMNS
+    first_row, last_row = cell(south, 0) // GRID_COLUMNS, cell(north, 0) // GRID_COLUMNS
+    return [(row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column)
+            for row in range(first_row, last_row + 1)]
@@ -0,0 +1,60 @@
+"""Gunicorn presets; see serving.py for the sizing and its environment variables.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+
+from serving import plan
+
+_plan = plan()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+worker_class = _plan.worker_class
+workers = _plan.workers
+threads = _plan.threads
+worker_connections = _plan.worker_connections
+
+# Import the app once in the master and fork it. gevent has to patch the
+# standard library before the app is imported, so it loads in each worker.
+preload_app = _plan.worker_class != 'gevent'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+# On SIGTERM workers stop accepting requests and get this long to finish them.
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Recycle workers now and then to bound the growth of per-process caches.
+max_requests = 1000
+max_requests_jitter = 100
+accesslog = '-'
+
+
+def _dispose_engines(worker):
+    from replicas import engines
+    for engine in engines(worker.wsgi):
+        engine.dispose()
+
+
+def post_fork(server, worker):
+    if _plan.worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            server.log.warning('psycogreen is not installed; database calls will block gevent workers.')
+        else:
+            patch_psycopg()
+
+
+def post_worker_init(worker):
+    # Pooled connections opened before the fork belong to the master.
+    _dispose_engines(worker)
+
+
+def worker_exit(server, worker):
+    # Close pooled connections instead of leaving Postgres to time them out.
+    _dispose_engines(worker)
+
+
+def when_ready(server):
+    server.log.info(
+        f'{_plan.workers} {_plan.worker_class} workers, {_plan.threads} threads, '
+        f'{_plan.pool_size} database connections per worker')
@@ -0,0 +1,379 @@
+"""Bulk import of artists, venues and shows from CSV or NDJSON.
+
+Files are parsed as a stream and handled in batches. Every row is validated
+with the same form as the create pages, show rows may reference artists and
+venues by id or by name, and each batch is written with one executemany
+INSERT. Invalid rows are reported with their line number and skipped; they
+never abort the rest of the import.
+"""
+import csv
+import io
+import json
+from abc import ABC, abstractmethod
+from itertools import islice
+
+import click
+from flask import Blueprint, jsonify, request
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+
+import cache
+import counters
+import geo
+import scheduling
+from models import db, Artist, Genre, GENRE_ASSOCIATIONS, Show, Venue, search_document
+
+BATCH_SIZE = 1000
+FORMATS = ('csv', 'ndjson')
+MAX_REPORTED_ERRORS = 1000
+
+bp = Blueprint('importer', __name__)
+
+
+def parse_rows(stream, file_format):
+    """Yield (line number, row dict) from a text stream of CSV or NDJSON."""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == 'ndjson':
+        for line_num, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_num, json.loads(line)
+                except ValueError:
+                    yield line_num, None
+    else:
+        raise ValueError(f'Unknown import format {file_format!r}')
+
+
+def _formdata(row):
+    data = MultiDict()
+    for key, value in row.items():
+        if key == 'genres' and isinstance(value, str):
+            value = [genre.strip() for genre in value.split(',') if genre.strip()]
+        if isinstance(value, list):
+            for item in value:
+                data.add(key, str(item))
+        elif value is not None:
+            data.add(key, str(value))
+    return data
+
+
+def _boolean(value):
+    return json.loads(str(value).lower())
+
+
+class Importer(ABC):
+    form = None
+    table = None
+
+    def __init__(self):
+        self.inserted = 0
+        self.errors = []
+        self.error_count = 0
+
+    def reject(self, line_num, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_num, 'errors': errors})
+
+    def validate(self, batch):
+        # The WTForms classes are only loaded once something is imported.
+        import forms
+        form_class = getattr(forms, self.form)
+        records = []
+        for line_num, row in batch:
+            if not isinstance(row, dict):
+                self.reject(line_num, {'row': ['Not a JSON object.']})
+                continue
+            form = form_class(formdata=_formdata(row), meta={'csrf': False})
+            if form.validate():
+                records.append((line_num, self.record(form, row)))
+            else:
+                self.reject(line_num, form.errors)
+        return records
+
+    @abstractmethod
+    def record(self, form, row):
+        """The column values to insert for a validated row."""
+
+    def resolve(self, records):
+        return records
+
+    def write(self, records):
+        db.session.execute(self.table.insert(), records)
+
+    def insert(self, records):
+        if not records:
+            return
+        try:
+            self.write([record for _, record in records])
+            db.session.commit()
+            self.inserted += len(records)
+        except SQLAlchemyError:
+            # Retry row by row to report exactly which rows the database rejects.
+            db.session.rollback()
+            for line_num, record in records:
+                try:
+                    self.write([record])
+                    db.session.commit()
+                    self.inserted += 1
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    self.reject(line_num, {'database': [str(e.orig if hasattr(e, 'orig') else e)]})
+        self.inserted_batch(records)
+
+    def inserted_batch(self, records):
+        pass
+
+    def run(self, rows, batch_size=BATCH_SIZE):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            self.insert(self.resolve(self.validate(batch)))
+        return self.report()
+
+    def report(self):
+        return {
+            'inserted': self.inserted,
+            'rejected': self.error_count,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+        }
+
+
+class GenreTaggedImporter(Importer):
+    """Artists and venues, whose genres live in an association table.
+
+    On PostgreSQL the ids of a batch are drawn from the table's sequence up
+    front so the rows and their genre links are both written with one
+    executemany; elsewhere rows are inserted one at a time for their ids.
+    """
+    model = None
+
+    def _allocate_ids(self, count):
+        if db.session.get_bind().dialect.name != 'postgresql':
+            return None
+        return [row[0] for row in db.session.execute(
+            text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+            {'table': self.table.name, 'count': count})]
+
+    def write(self, records):
+        rows = [{key: value for key, value in record.items() if key != 'genres'} for record in records]
+        ids = self._allocate_ids(len(rows))
+        if ids is None:
+            ids = [db.session.execute(self.table.insert(), row).inserted_primary_key[0] for row in rows]
+        else:
+            db.session.execute(self.table.insert(), [dict(row, id=id) for id, row in zip(ids, rows)])
+
+        association, foreign_key = GENRE_ASSOCIATIONS[self.model]
+        genre_ids = Genre.ids(name for record in records for name in record['genres'])
+        links = [{'genre_id': genre_ids[name], foreign_key.name: id}
+                 for id, record in zip(ids, records) for name in set(record['genres']) if name]
+        if links:
+            db.session.execute(association.insert(), links)
+
+
+class ArtistImporter(GenreTaggedImporter):
+    form = 'ArtistForm'
+    model = Artist
+    table = Artist.__table__
+
+    def record(self, form, row):
+        return {
+            'name': form.name.data,
+            'city': form.city.data,
+            'state': form.state.data,
+            'phone': form.phone.data,
+            'genres': form.genres.data,
+            'image_link': form.image_link.data,
+            'facebook_link': form.facebook_link.data,
+            'website': form.website.data,
+            'seeking_venue': _boolean(form.seeking_venue.data),
+            'seeking_description': form.seeking_description.data,
+            'search_text': search_document(form.name.data, form.city.data, form.state.data,
+                                           form.genres.data),
+        }
+
+    def inserted_batch(self, records):
+        cache.invalidate('artists')
+
+
+class VenueImporter(GenreTaggedImporter):
+    form = 'VenueForm'
+    model = Venue
+    table = Venue.__table__
+
+    def record(self, form, row):
+        return {
+            'name': form.name.data,
+            'city': form.city.data,
+            'state': form.state.data,
+            'address': form.address.data,
+            'phone': form.phone.data,
+            'genres': form.genres.data,
+            'image_link': form.image_link.data,
+            'facebook_link': form.facebook_link.data,
+            'website': form.website.data,
+            'seeking_talent': _boolean(form.seeking_talent.data),
+            'seeking_description': form.seeking_description.data,
+            'search_text': search_document(form.name.data, form.city.data, form.state.data,
+                                           form.genres.data),
+            **geo.location(form.address.data, form.city.data, form.state.data),
+        }
+
+    def inserted_batch(self, records):
+        cache.invalidate('venues')
+
+
+class ShowImporter(Importer):
+    form = 'ShowForm'
+    table = Show.__table__
+
+    def record(self, form, row):
+        # Shows may name their artist and venue instead of giving ids.
+        return {
+            'artist_id': form.artist_id.data or None,
+            'artist_name': row.get('artist_name'),
+            'venue_id': form.venue_id.data or None,
+            'venue_name': row.get('venue_name'),
+            'start_time': form.start_time.data,
+            'duration': form.duration.data,
+        }
+
+    def _lookup(self, model, records, prefix):
+        ids = set()
+        names = set()
+        for _, record in records:
+            if record[f'{prefix}_id']:
+                try:
+                    ids.add(int(record[f'{prefix}_id']))
+                except ValueError:
+                    pass
+            elif record[f'{prefix}_name']:
+                names.add(record[f'{prefix}_name'])
+
+        known_ids = set()
+        if ids:
+            known_ids = {row.id for row in db.session.query(model.id).filter(model.id.in_(ids))}
+        by_name = {}
+        if names:
+            # Ambiguous names resolve to the oldest row with that name.
+            for row in db.session.query(model.id, model.name).filter(
+                    model.name.in_(names)).order_by(model.id.desc()):
+                by_name[row.name] = row.id
+        return known_ids, by_name
+
+    def _reference(self, record, prefix, known_ids, by_name):
+        if record[f'{prefix}_id']:
+            try:
+                reference = int(record[f'{prefix}_id'])
+            except ValueError:
+                return None
+            return reference if reference in known_ids else None
+        return by_name.get(record[f'{prefix}_name'])
+
+    def resolve(self, records):
+        artist_ids, artists_by_name = self._lookup(Artist, records, 'artist')
+        venue_ids, venues_by_name = self._lookup(Venue, records, 'venue')
+
+        referenced = []
+        for line_num, record in records:
+            artist_id = self._reference(record, 'artist', artist_ids, artists_by_name)
+            venue_id = self._reference(record, 'venue', venue_ids, venues_by_name)
+            errors = {}
+            if artist_id is None:
+                errors['artist_id'] = ['Unknown artist.']
+            if venue_id is None:
+                errors['venue_id'] = ['Unknown venue.']
+            if errors:
+                self.reject(line_num, errors)
+                continue
+            referenced.append((line_num, scheduling.slot(artist_id, venue_id, record['start_time'],
+                                                         record['duration'])))
+        return self._schedule(referenced)
+
+    def _schedule(self, slots):
+        # Shows may neither overlap existing shows nor earlier rows of the batch.
+        resolved = []
+        accepted = []
+        existing = scheduling.conflicts([slot for _, slot in slots])
+        for (line_num, slot), found in zip(slots, existing):
+            overlapping = [other for other in accepted
+                           if (other.artist_id == slot.artist_id or other.venue_id == slot.venue_id)
+                           and scheduling.overlaps(other, slot)]
+            if found:
+                self.reject(line_num, {'start_time': [str(scheduling.SchedulingConflict(found))]})
+                continue
+            if overlapping:
+                self.reject(line_num, {'start_time': ['Overlaps an earlier show in the file.']})
+                continue
+            accepted.append(slot)
+            resolved.append((line_num, slot._asdict()))
+        return resolved
+
+    def inserted_batch(self, records):
+        artist_ids = {record['artist_id'] for _, record in records}
+        venue_ids = {record['venue_id'] for _, record in records}
+        counters.refresh_counters(artist_ids=artist_ids, venue_ids=venue_ids)
+        db.session.commit()
+        cache.invalidate('shows', 'venues',
+                         *(f'artist:{artist_id}' for artist_id in artist_ids),
+                         *(f'venue:{venue_id}' for venue_id in venue_ids))
+
+
+IMPORTERS = {
+    'artists': ArtistImporter,
+    'venues': VenueImporter,
+    'shows': ShowImporter,
+}
+
+
+def _format(filename, file_format):
+    if file_format:
+        return file_format
+    return 'ndjson' if filename.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+@bp.route('/import/<any(artists, venues, shows):kind>', methods=['POST'])
+def import_upload(kind):
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify(error='Upload the rows as the "file" field.'), 400
+    file_format = _format(upload.filename or '', request.form.get('format'))
+    if file_format not in FORMATS:
+        return jsonify(error=f"format must be one of {', '.join(FORMATS)}."), 400
+
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+    try:
+        return jsonify(IMPORTERS[kind]().run(parse_rows(stream, file_format)))
+    except (csv.Error, UnicodeDecodeError) as e:
+        # Batches before the bad one are already committed.
+        db.session.rollback()
+        return jsonify(error=f'Could not read the file: {e}'), 400
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(FORMATS),
+              help='File format; guessed from the extension by default.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+@with_appcontext
+def import_command(kind, path, file_format, batch_size):
+    """Bulk import artists, venues or shows from a CSV or NDJSON file."""
+    with open(path, encoding='utf-8', newline='') as stream:
+        report = IMPORTERS[kind]().run(parse_rows(stream, _format(path, file_format)), batch_size)
+
+    for error in report['errors']:
+        click.echo(f"line {error['line']}: {json.dumps(error['errors'])}", err=True)
+    click.echo(f"Imported {report['inserted']} {kind}, rejected {report['rejected']}.")
+
+
+def init_app(app):
+    app.register_blueprint(bp)
+    app.cli.add_command(import_command)
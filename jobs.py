@@ -0,0 +1,197 @@
+"""Database-backed background job queue.
+
+Write handlers enqueue work with `enqueue()` in the same transaction as
+the write itself, so a job exists exactly when the write committed, and
+return without waiting for it. `flask worker` claims due jobs in batches
+and runs the handler registered for their kind. Several workers can run
+at once: on Postgres they claim with FOR UPDATE SKIP LOCKED, elsewhere
+the claim is a guarded UPDATE that only one of them wins.
+
+A job that raises is retried with exponential backoff until it has run
+max_attempts times and is then marked failed. A worker that dies
+mid-job loses its lease after LEASE_SECONDS and the job is claimed again,
+so handlers must be safe to run twice. Jobs with an idempotency key are
+only ever enqueued once per key.
+"""
+import signal
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects import postgresql
+
+from models import db, Job
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+LEASE_SECONDS = 300
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 3600
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Register the decorated function to run jobs of `kind` with their payload as keywords."""
+    def decorator(function):
+        HANDLERS[kind] = function
+        return function
+    return decorator
+
+
+def enqueue(kind, key=None, delay=0, max_attempts=5, **payload):
+    """Queue a `kind` job in the current transaction; the caller commits.
+
+    With a `key`, a job already queued (or run) under the same key makes
+    this a no-op.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f'No handler registered for {kind!r} jobs.')
+    now = datetime.utcnow()
+    values = {
+        'kind': kind,
+        'payload': payload,
+        'idempotency_key': key,
+        'status': QUEUED,
+        'attempts': 0,
+        'max_attempts': max_attempts,
+        'run_at': now + timedelta(seconds=delay),
+        'created_at': now,
+    }
+    if db.session.get_bind().dialect.name == 'postgresql':
+        statement = postgresql.insert(Job.__table__).on_conflict_do_nothing(
+            index_elements=['idempotency_key'])
+    else:
+        statement = Job.__table__.insert().prefix_with('OR IGNORE')
+    db.session.execute(statement, values)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1)))
+
+
+def claim(batch=10, now=None):
+    """Lease up to `batch` due jobs to this worker and commit the lease."""
+    now = now or datetime.utcnow()
+    due = or_(
+        and_(Job.status == QUEUED, Job.run_at <= now),
+        # Leases of workers that died.
+        and_(Job.status == RUNNING, Job.locked_at < now - timedelta(seconds=LEASE_SECONDS)),
+    )
+    candidates = db.session.query(Job.id, Job.attempts).filter(due).order_by(
+        Job.run_at, Job.id).limit(batch).with_for_update(skip_locked=True).all()
+
+    claimed = []
+    for job_id, attempts in candidates:
+        # Only one worker moves a job past the attempts it read.
+        leased = db.session.execute(Job.__table__.update().where(
+            and_(Job.id == job_id, Job.attempts == attempts)
+        ).values(status=RUNNING, locked_at=now, attempts=attempts + 1))
+        if leased.rowcount:
+            claimed.append(job_id)
+    db.session.commit()
+    return Job.query.filter(Job.id.in_(claimed)).order_by(Job.run_at, Job.id).all() if claimed else []
+
+
+def run(job):
+    """Run a claimed job and record the outcome."""
+    try:
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Lease expired on the last attempt.')
+        result = HANDLERS[job.kind](**job.payload)
+    except Exception as error:
+        db.session.rollback()
+        job.last_error = ''.join(traceback.format_exception_only(type(error), error)).strip()
+        if job.attempts < job.max_attempts:
+            job.status = QUEUED
+            job.run_at = datetime.utcnow() + retry_delay(job.attempts)
+        else:
+            job.status = FAILED
+            job.finished_at = datetime.utcnow()
+        current_app.logger.warning(f'Job {job.id} ({job.kind}) attempt {job.attempts} failed: {job.last_error}')
+    else:
+        job.status = DONE
+        job.result = result
+        job.finished_at = datetime.utcnow()
+    job.locked_at = None
+    db.session.commit()
+    return job.status
+
+
+def work(batch=10, poll=1.0, burst=False, should_stop=lambda: False):
+    """Drain the queue; with `burst`, return once nothing is due. Returns the jobs run."""
+    processed = 0
+    while not should_stop():
+        jobs = claim(batch)
+        for job in jobs:
+            run(job)
+            processed += 1
+            if should_stop():
+                # Jobs claimed but not run go back to the queue.
+                release(jobs)
+                return processed
+        if not jobs:
+            if burst:
+                break
+            time.sleep(poll)
+    return processed
+
+
+def release(jobs):
+    for job in jobs:
+        if job.status == RUNNING:
+            job.status = QUEUED
+            job.attempts -= 1
+            job.locked_at = None
+    db.session.commit()
+
+
+def counts():
+    return dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status))
+
+
+@click.command('worker')
+@click.option('--batch', default=10, show_default=True, help='Jobs claimed at a time.')
+@click.option('--poll', default=1.0, show_default=True, help='Seconds to wait when the queue is empty.')
+@click.option('--burst', is_flag=True, help='Exit once no job is due.')
+@with_appcontext
+def worker_command(batch, poll, burst):
+    """Run queued background jobs."""
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    # Finish the job at hand on SIGTERM/SIGINT, then exit.
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    click.echo('Waiting for jobs.')
+    processed = work(batch, poll, burst, should_stop=lambda: bool(stopping))
+    click.echo(f'Ran {processed} jobs.')
+
+
+@click.command('jobs')
+@click.option('--retry-failed', is_flag=True, help='Queue the failed jobs again.')
+@with_appcontext
+def jobs_command(retry_failed):
+    """Show the number of jobs by status."""
+    if retry_failed:
+        retried = Job.query.filter(Job.status == FAILED).update(
+            {'status': QUEUED, 'attempts': 0, 'run_at': datetime.utcnow(), 'finished_at': None},
+            synchronize_session=False)
+        db.session.commit()
+        click.echo(f'Queued {retried} failed jobs again.')
+    for status, count in sorted(counts().items()):
+        click.echo(f'{status:8} {count}')
+
+
+def init_app(app):
+    app.cli.add_command(worker_command)
+    app.cli.add_command(jobs_command)
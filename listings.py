@@ -0,0 +1,70 @@
+from itertools import groupby
+
+from flask import request
+
+from models import db, Genre, GENRE_ASSOCIATIONS, Venue
+from pagination import keyset_page
+
+VENUE_AREA_KEY = (Venue.city, Venue.state, Venue.name, Venue.id)
+
+
+def with_genre(query, model, genre):
+    """Restrict `query` to rows of `model` tagged with the genre named `genre`.
+
+    Served by the unique index on genres.name and the (genre_id, ...) primary
+    key of the association table.
+    """
+    association, foreign_key = GENRE_ASSOCIATIONS[model]
+    return query.join(association, foreign_key == model.id).join(
+        Genre, Genre.id == association.c.genre_id).filter(Genre.name == genre)
+
+
+def filtered(query, model, genre=None, city=None, state=None):
+    if genre:
+        query = with_genre(query, model, genre)
+    if city:
+        query = query.filter(model.city == city)
+    if state:
+        query = query.filter(model.state == state)
+    return query
+
+
+def request_filters():
+    """filtered() arguments from the query string of the current request."""
+    return {
+        'genre': request.args.get('genre'),
+        'city': request.args.get('city'),
+        'state': request.args.get('state'),
+    }
+
+
+def venue_areas(cursor=None, limit=None, **filters):
+    """One page of venues grouped by (city, state) with their upcoming show counts.
+
+    The counts are read from the materialized counters on each venue row, so
+    a page comes from a single keyset query ordered by area and is built in
+    one pass. `filters` (genre, city, state) narrow the directory. Returns
+    the areas and the cursor of the next page.
+    """
+    query = db.session.query(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        Venue.upcoming_shows_count
+    )
+    query = filtered(query, Venue, **filters)
+    rows, next_cursor = keyset_page(query, VENUE_AREA_KEY, cursor, limit)
+
+    areas = []
+    for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+        areas.append({
+            'city': city,
+            'state': state,
+            'venues': [{
+                'id': venue.id,
+                'name': venue.name,
+                'num_upcoming_shows': venue.upcoming_shows_count
+            } for venue in venues]
+        })
+    return areas, next_cursor
@@ -0,0 +1,264 @@
+"""Live feed of new shows over Server-Sent Events.
+
+`GET /shows/live` streams an event for every show booked from then on,
+optionally only those of a venue_id, artist_id or city (and state), so
+pages add new bookings as they happen instead of being reloaded.
+
+Events are published by create_show_submission when its transaction
+commits and fanned out by a broker (LIVE_BACKEND):
+
+- 'local': in-process queues. Only clients connected to the worker that
+  took the booking hear of it, so it suits the development server and
+  single-process deployments.
+- 'postgres': pg_notify() in the booking's transaction, and one LISTEN
+  connection per worker process, outside its pool, that hands the
+  notifications to the local queues. Every worker hears every booking.
+
+A stream ends after LIVE_STREAM_SECONDS, well within any worker timeout,
+and the browser reconnects with Last-Event-ID; the shows booked in
+between are replayed from the database, so none are missed.
+
+An open stream holds a request slot, so streams are only served where
+those are cheap, under gevent (LIVE_STREAMS, see serving.py). Elsewhere
+the pages don't subscribe and the feed answers 204; bookings are still
+published, for any process that does serve it.
+"""
+import json
+import queue
+import select
+import threading
+import time
+
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from models import db, Artist, Show, Venue
+
+CHANNEL = 'fyyur_shows'
+QUEUE_SIZE = 100
+REPLAY_LIMIT = 100
+HEARTBEAT_SECONDS = 15
+# Milliseconds the browser waits before reconnecting.
+RETRY_MS = 1000
+
+bp = Blueprint('live', __name__)
+
+
+class Subscription:
+    def __init__(self, filters):
+        self.filters = filters
+        self.events = queue.Queue(QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, show):
+        return all(show.get(name) == value for name, value in self.filters.items())
+
+
+class LocalBroker:
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, filters):
+        subscription = Subscription(filters)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def count(self):
+        return len(self._subscriptions)
+
+    def deliver(self, show):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(show):
+                try:
+                    subscription.events.put_nowait(show)
+                except queue.Full:
+                    # The stream ends and the client catches up by replaying.
+                    subscription.overflowed = True
+
+    def publish(self, show):
+        """Deliver `show` once the current transaction commits."""
+        db.session.info.setdefault('live_shows', []).append(show)
+
+
+class PostgresBroker(LocalBroker):
+    def __init__(self, app):
+        super().__init__()
+        self._app = app
+        self._listener = None
+
+    def subscribe(self, filters):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                # Started on demand: after gunicorn has forked the worker.
+                self._listener = threading.Thread(target=self._listen, name='live-listener', daemon=True)
+                self._listener.start()
+        return super().subscribe(filters)
+
+    def publish(self, show):
+        # Postgres sends it on commit, and not at all on rollback.
+        db.session.execute(db.select([func.pg_notify(CHANNEL, json.dumps(show))]))
+
+    def _listen(self):
+        while True:
+            dbapi_connection = None
+            try:
+                connection = db.get_engine(self._app).raw_connection()
+                # Outside the pool: this connection is held for good.
+                connection.detach()
+                dbapi_connection = connection.connection
+                dbapi_connection.autocommit = True
+                dbapi_connection.cursor().execute(f'LISTEN {CHANNEL}')
+                while True:
+                    if select.select([dbapi_connection], [], [], HEARTBEAT_SECONDS) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        self.deliver(json.loads(dbapi_connection.notifies.pop(0).payload))
+            except Exception:
+                self._app.logger.exception('Live feed listener lost its connection; reconnecting.')
+                if dbapi_connection is not None:
+                    # Detached, so nothing else would ever close it.
+                    try:
+                        dbapi_connection.close()
+                    except Exception:
+                        pass
+                time.sleep(1)
+
+
+def _broker():
+    return current_app.extensions['live']
+
+
+@event.listens_for(Session, 'after_commit')
+def _deliver_committed(session):
+    shows = session.info.pop('live_shows', None)
+    if shows:
+        broker = _broker()
+        for show in shows:
+            broker.deliver(show)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('live_shows', None)
+
+
+def _show_columns():
+    return (Show.id, Show.artist_id, Show.venue_id, Show.start_time, Show.end_time,
+            Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+            Venue.name.label('venue_name'), Venue.city, Venue.state)
+
+
+def _as_event(row):
+    show = row._asdict()
+    show['start_time'] = str(show['start_time'])
+    show['end_time'] = str(show['end_time'])
+    return show
+
+
+def published(show):
+    """Announce a show added in the current transaction; the caller commits."""
+    row = db.session.query(*_show_columns()).join(Artist, Artist.id == Show.artist_id).join(
+        Venue, Venue.id == Show.venue_id).filter(Show.id == show.id).one()
+    _broker().publish(_as_event(row))
+
+
+def _replay(after_id, filters):
+    columns = {'venue_id': Show.venue_id, 'artist_id': Show.artist_id,
+               'city': Venue.city, 'state': Venue.state}
+    query = db.session.query(*_show_columns()).join(Artist, Artist.id == Show.artist_id).join(
+        Venue, Venue.id == Show.venue_id).filter(Show.id > after_id)
+    for name, value in filters.items():
+        query = query.filter(columns[name] == value)
+    return [_as_event(row) for row in query.order_by(Show.id).limit(REPLAY_LIMIT)]
+
+
+def _filters(args):
+    filters = {}
+    for name in ('venue_id', 'artist_id'):
+        if args.get(name):
+            filters[name] = args.get(name, type=int)
+            if filters[name] is None:
+                abort(400)
+    for name in ('city', 'state'):
+        if args.get(name):
+            filters[name] = args[name]
+    return filters
+
+
+def _message(show):
+    return f"id: {show['id']}\nevent: show\ndata: {json.dumps(show)}\n\n"
+
+
+@bp.route('/shows/live')
+def live_shows():
+    if not current_app.config.get('LIVE_STREAMS'):
+        # No Content tells EventSource to stop reconnecting.
+        return '', 204
+    filters = _filters(request.args)
+    broker = _broker()
+    if broker.count() >= current_app.config.get('LIVE_MAX_SUBSCRIBERS', 1000):
+        abort(503)
+
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        # The newest show so far: everything after it is news.
+        last_id = db.session.query(func.coalesce(func.max(Show.id), 0)).scalar()
+    # Subscribed before replaying, so nothing falls in between.
+    subscription = broker.subscribe(filters)
+    replayed = _replay(last_id, filters)
+    # Don't hold a database connection for the life of the stream.
+    db.session.remove()
+    stream_seconds = current_app.config.get('LIVE_STREAM_SECONDS', 25)
+
+    def generate():
+        try:
+            # Sets the Last-Event-ID of the reconnect even if no show comes.
+            yield f'id: {last_id}\nretry: {RETRY_MS}\n\n'
+            for show in replayed:
+                yield _message(show)
+            replayed_ids = {show['id'] for show in replayed}
+            ends = time.monotonic() + stream_seconds
+            while not subscription.overflowed:
+                remaining = ends - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    show = subscription.events.get(timeout=min(remaining, HEARTBEAT_SECONDS))
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if show['id'] not in replayed_ids:
+                    yield _message(show)
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Also when the client goes away before the stream starts.
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    return response
+
+
+def init_app(app):
+    backend = app.config.get('LIVE_BACKEND')
+    if backend is None:
+        backend = 'postgres' if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql') else 'local'
+    if backend == 'local':
+        broker = LocalBroker()
+    elif backend == 'postgres':
+        broker = PostgresBroker(app)
+    else:
+        raise ValueError(f'Unknown LIVE_BACKEND {backend!r}')
+    app.extensions['live'] = broker
+    app.extensions.setdefault('perf_metrics', {})['live'] = lambda: {'subscribers': broker.count()}
+    app.register_blueprint(bp)
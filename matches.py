@@ -0,0 +1,303 @@
+"""Suggested venues for artists, and artists for venues.
+
+Every artist–venue pair scores from 0 to 1, the WEIGHTS-weighted sum of:
+- genres: the cosine similarity of their genre sets;
+- distance: exp(-km / DISTANCE_KM) from the artist's city to the venue,
+  or 1 for the same city and state when either can't be located;
+- seeking: 1 when the artist seeks venues and the venue seeks talent,
+  0.5 when one of them does;
+- history: the co-bookings linking them, i.e. the paths artist, venue
+  played, artist who played there too, this venue (the artist's own
+  shows at the venue count as well), as 1 - exp(-paths / HISTORY_SCALE).
+Each part is symmetric, so a venue's score for an artist is the artist's
+for the venue.
+
+The scores are computed with NumPy from Features, matrices each worker
+loads once and then only syncs with what changed: a row at a time, one
+artist against every venue or the other way round. Only the TOP_N best of
+each row are kept, in the matches table, so the artist and venue pages
+read them with one indexed query (details.suggested()) and web workers
+never load this module or NumPy.
+
+`flask worker` keeps them current: after an artist or venue is saved, or
+a show booked, the rows of those entities are recomputed, then the rows
+of the counterparts whose lists they enter or leave. A booking also
+shifts the history of everyone sharing a venue with the pair a little;
+`flask rebuild-matches`, run nightly, recomputes everything.
+"""
+from datetime import datetime, timedelta
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, or_
+
+import geo
+from models import db, Artist, GENRE_ASSOCIATIONS, Match, Show, Venue
+
+TOP_N = 6
+WEIGHTS = {'genres': 0.4, 'distance': 0.25, 'seeking': 0.15, 'history': 0.2}
+DISTANCE_KM = 150
+HISTORY_SCALE = 3
+# Below this a pair has little more than a seeking flag or a city in common.
+MIN_SCORE = 0.3
+BATCH = 500
+# Rows committed this long after they were stamped are still picked up.
+SYNC_MARGIN = timedelta(minutes=5)
+# Also catches what doesn't move updated_at, e.g. `flask geocode-venues`.
+RELOAD_AFTER = timedelta(days=1)
+
+KINDS = ('artist', 'venue')
+OTHER = {'artist': 'venue', 'venue': 'artist'}
+MODELS = {'artist': Artist, 'venue': Venue}
+
+
+def _distances_km(latitude, longitude, latitudes, longitudes):
+    """Haversine distances from one point to arrays of points (NaN where unknown)."""
+    phi, phis = np.radians(latitude), np.radians(latitudes)
+    a = (np.sin((phis - phi) / 2) ** 2
+         + np.cos(phi) * np.cos(phis) * np.sin(np.radians(longitudes - longitude) / 2) ** 2)
+    return 2 * geo.EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class Features:
+    """What the scores are computed from, for every artist and venue.
+
+    Loaded in full once per process, then kept current by update(), which
+    reloads only the entities and shows changed since the last sync.
+    """
+
+    def __init__(self):
+        self.built_at = self.synced_at = datetime.utcnow()
+        self.ids = {kind: np.zeros(0, dtype=np.int64) for kind in KINDS}
+        self.index = {kind: {} for kind in KINDS}
+        self.seeking = {kind: np.zeros(0) for kind in KINDS}
+        self.points = {kind: np.zeros((0, 2)) for kind in KINDS}
+        # Cities as numbers, -1 for none, to compare them as arrays.
+        self.places = {kind: np.zeros(0, dtype=np.int64) for kind in KINDS}
+        self.genres = {kind: np.zeros((0, 0)) for kind in KINDS}
+        self.pairs = {kind: np.zeros(0, dtype=np.int64) for kind in KINDS}
+        self._place_codes = {}
+        self._genre_columns = {}
+        self._pair_set = set()
+        for kind in KINDS:
+            self._load(kind)
+        self._load_pairs()
+
+    def update(self, artist_ids=(), venue_ids=()):
+        """Reload these entities and whatever was saved or booked since the last sync."""
+        since = self.synced_at - SYNC_MARGIN
+        self.synced_at = datetime.utcnow()
+        shows = [Show.updated_at >= since]
+        for kind, ids in (('artist', artist_ids), ('venue', venue_ids)):
+            model = MODELS[kind]
+            criteria = [model.updated_at >= since]
+            if ids:
+                criteria.append(model.id.in_(list(ids)))
+                shows.append((Show.artist_id if kind == 'artist' else Show.venue_id).in_(list(ids)))
+            self._load(kind, or_(*criteria))
+        self._load_pairs(or_(*shows))
+
+    def _load(self, kind, criterion=None):
+        model = MODELS[kind]
+        if kind == 'artist':
+            query = db.session.query(Artist.id, Artist.city, Artist.state, Artist.seeking_venue.label('seeking'))
+        else:
+            query = db.session.query(Venue.id, Venue.city, Venue.state, Venue.latitude, Venue.longitude,
+                                     Venue.seeking_talent.label('seeking'))
+        if criterion is not None:
+            query = query.filter(criterion)
+        rows = query.order_by(model.id).all()
+        if not rows:
+            return
+
+        self._grow(kind, [row.id for row in rows if row.id not in self.index[kind]])
+        at = [self.index[kind][row.id] for row in rows]
+        self.seeking[kind][at] = [bool(row.seeking) for row in rows]
+        # Artists are placed at their city; venues where they were geocoded.
+        self.points[kind][at] = [
+            (geo.locate(None, row.city, row.state) or (np.nan, np.nan)) if kind == 'artist' else
+            (np.nan if row.latitude is None else row.latitude, np.nan if row.longitude is None else row.longitude)
+            for row in rows]
+        self.places[kind][at] = [
+            self._place_codes.setdefault((row.city.strip().lower(), (row.state or '').upper()),
+                                         len(self._place_codes)) if row.city else -1
+            for row in rows]
+        self._load_genres(kind, at, None if criterion is None else [row.id for row in rows])
+
+    def _grow(self, kind, new_ids):
+        if not new_ids:
+            return
+        count = len(new_ids)
+        for i, entity_id in enumerate(new_ids, len(self.ids[kind])):
+            self.index[kind][entity_id] = i
+        self.ids[kind] = np.concatenate([self.ids[kind], np.array(new_ids, dtype=np.int64)])
+        self.seeking[kind] = np.concatenate([self.seeking[kind], np.zeros(count)])
+        self.points[kind] = np.concatenate([self.points[kind], np.full((count, 2), np.nan)])
+        self.places[kind] = np.concatenate([self.places[kind], np.full(count, -1, dtype=np.int64)])
+        self.genres[kind] = np.concatenate([self.genres[kind], np.zeros((count, len(self._genre_columns)))])
+
+    def _load_genres(self, kind, at, ids):
+        """Reload the genre rows `at` (of `ids`, or of everyone), scaled to unit length."""
+        association, foreign_key = GENRE_ASSOCIATIONS[MODELS[kind]]
+        query = db.session.query(foreign_key, association.c.genre_id)
+        if ids is not None:
+            query = query.filter(foreign_key.in_(ids))
+        links = [(entity_id, genre_id) for entity_id, genre_id in query if entity_id in self.index[kind]]
+
+        new_genres = sorted({genre_id for _, genre_id in links} - self._genre_columns.keys())
+        if new_genres:
+            for genre_id in new_genres:
+                self._genre_columns[genre_id] = len(self._genre_columns)
+            for each in KINDS:
+                self.genres[each] = np.hstack([self.genres[each], np.zeros((len(self.ids[each]), len(new_genres)))])
+
+        matrix = self.genres[kind]
+        matrix[at] = 0.0
+        if links:
+            matrix[tuple(np.array([(self.index[kind][entity_id], self._genre_columns[genre_id])
+                                   for entity_id, genre_id in links]).T)] = 1.0
+        rows = matrix[at]
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        matrix[at] = np.divide(rows, norms, out=rows, where=norms > 0)
+
+    def _load_pairs(self, criterion=None):
+        """Add the distinct (artist, venue) pairs of the shows matching `criterion`."""
+        query = db.session.query(Show.artist_id, Show.venue_id).distinct()
+        if criterion is not None:
+            query = query.filter(criterion)
+        new_pairs = []
+        for artist_id, venue_id in query:
+            if artist_id in self.index['artist'] and venue_id in self.index['venue']:
+                pair = (self.index['artist'][artist_id], self.index['venue'][venue_id])
+                if pair not in self._pair_set:
+                    self._pair_set.add(pair)
+                    new_pairs.append(pair)
+        if new_pairs:
+            new_pairs = np.array(new_pairs, dtype=np.int64)
+            self.pairs = {'artist': np.concatenate([self.pairs['artist'], new_pairs[:, 0]]),
+                          'venue': np.concatenate([self.pairs['venue'], new_pairs[:, 1]])}
+
+    def scores(self, kind, entity_id):
+        """The scores of one artist against every venue, or one venue against every artist."""
+        other = OTHER[kind]
+        i = self.index[kind][entity_id]
+
+        genres = self.genres[other] @ self.genres[kind][i]
+
+        latitude, longitude = self.points[kind][i]
+        with np.errstate(invalid='ignore'):
+            distance = np.exp(-_distances_km(latitude, longitude, *self.points[other].T) / DISTANCE_KM)
+        unknown = np.isnan(distance)
+        same_place = (self.places[other] == self.places[kind][i]) & (self.places[kind][i] >= 0)
+        distance[unknown] = same_place[unknown]
+
+        seeking = (self.seeking[other] + self.seeking[kind][i]) / 2
+
+        mine, theirs = self.pairs[kind], self.pairs[other]
+        played = np.zeros(len(self.ids[other]))
+        played[theirs[mine == i]] = 1
+        # Peers: entities of this kind sharing counterparts with this one, by how many.
+        peers = np.bincount(mine, weights=played[theirs], minlength=len(self.ids[kind]))
+        paths = np.bincount(theirs, weights=peers[mine], minlength=len(self.ids[other]))
+        history = 1 - np.exp(-paths / HISTORY_SCALE)
+
+        return (WEIGHTS['genres'] * genres + WEIGHTS['distance'] * distance
+                + WEIGHTS['seeking'] * seeking + WEIGHTS['history'] * history)
+
+    def top(self, kind, scores, n=TOP_N):
+        """The (id, score) of the `n` best counterparts in a row of scores, best first."""
+        ids = self.ids[OTHER[kind]]
+        candidates = np.flatnonzero(scores >= MIN_SCORE)
+        if len(candidates) > n:
+            candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+        best = candidates[np.lexsort((ids[candidates], -scores[candidates]))]
+        return [(int(ids[j]), float(scores[j])) for j in best]
+
+
+def _store(kind, tops, now):
+    """Replace the matches of the owners in `tops`, {owner id: [(id, score)]}."""
+    if not tops:
+        return
+    db.session.query(Match).filter(
+        Match.kind == kind, Match.owner_id.in_(list(tops))).delete(synchronize_session=False)
+    rows = [{'kind': kind, 'owner_id': owner_id, 'rank': rank, 'match_id': match_id,
+             'score': round(score, 4), 'computed_at': now}
+            for owner_id, top in tops.items() for rank, (match_id, score) in enumerate(top)]
+    if rows:
+        db.session.execute(Match.__table__.insert(), rows)
+
+
+def _affected(kind, rows, features):
+    """Owners of `kind` whose lists the counterparts scored in `rows`, {id: scores}, enter or leave."""
+    owners = {owner_id for owner_id, in db.session.query(Match.owner_id).filter(
+        Match.kind == kind, Match.match_id.in_(list(rows))).distinct()}
+
+    # A counterpart enters a full list by beating its lowest score.
+    threshold = np.full(len(features.ids[kind]), MIN_SCORE)
+    full = db.session.query(Match.owner_id, func.min(Match.score)).filter(
+        Match.kind == kind).group_by(Match.owner_id).having(func.count(Match.rank) >= TOP_N)
+    for owner_id, lowest in full:
+        if owner_id in features.index[kind]:
+            threshold[features.index[kind][owner_id]] = lowest
+    for scores in rows.values():
+        owners.update(features.ids[kind][scores > threshold].tolist())
+    return owners
+
+
+def current_features(artist_ids=(), venue_ids=()):
+    """This process's Features, updated with these artists and venues and
+    everything saved since; loaded again in full once a day."""
+    features = current_app.extensions.get('match_features')
+    if features is None or datetime.utcnow() - features.built_at > RELOAD_AFTER:
+        features = current_app.extensions['match_features'] = Features()
+    else:
+        features.update(artist_ids, venue_ids)
+    return features
+
+
+def refresh(artist_ids=(), venue_ids=(), features=None):
+    """Recompute the matches of these artists and venues, and of the
+    counterparts they now enter or leave. Returns the refreshed ids by kind;
+    the caller owns the transaction."""
+    features = features or current_features(artist_ids, venue_ids)
+    changed = {'artist': artist_ids, 'venue': venue_ids}
+    owners = {kind: set() for kind in KINDS}
+    for kind in KINDS:
+        rows = {entity_id: features.scores(kind, entity_id)
+                for entity_id in changed[kind] if entity_id in features.index[kind]}
+        if rows:
+            owners[kind].update(rows)
+            owners[OTHER[kind]].update(_affected(OTHER[kind], rows, features))
+
+    now = datetime.utcnow()
+    for kind in KINDS:
+        _store(kind, {owner_id: features.top(kind, features.scores(kind, owner_id))
+                      for owner_id in owners[kind]}, now)
+    return {kind: sorted(ids) for kind, ids in owners.items()}
+
+
+def rebuild():
+    """Recompute every artist's and venue's matches, committing in batches."""
+    features = current_app.extensions['match_features'] = Features()
+    for kind in KINDS:
+        ids = features.ids[kind].tolist()
+        for start in range(0, len(ids), BATCH):
+            now = datetime.utcnow()
+            _store(kind, {owner_id: features.top(kind, features.scores(kind, owner_id))
+                          for owner_id in ids[start:start + BATCH]}, now)
+            db.session.commit()
+    return {kind: len(ids) for kind, ids in features.ids.items()}
+
+
+@click.command('rebuild-matches')
+@with_appcontext
+def rebuild_matches_command():
+    """Recompute the suggested venues of every artist and artists of every venue."""
+    counts = rebuild()
+    click.echo(f"Matched {counts['artist']} artists and {counts['venue']} venues.")
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_matches_command)
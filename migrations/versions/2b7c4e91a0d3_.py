@@ -0,0 +1,40 @@
+"""add materialized show counters to artists and venues
+
+Revision ID: 2b7c4e91a0d3
+Revises: 7f454ee9dd60
+Create Date: 2026-10-18 09:12:40.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7c4e91a0d3'
+down_revision = '7f454ee9dd60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('artists', 'venues'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill; `flask backfill-counters` does the same from the application.
+    for table, foreign_key in (('artists', 'artist_id'), ('venues', 'venue_id')):
+        op.execute(
+            f'UPDATE {table} SET '
+            f'upcoming_shows_count = (SELECT count(*) FROM shows '
+            f'WHERE shows.{foreign_key} = {table}.id AND shows.start_time >= CURRENT_TIMESTAMP), '
+            f'past_shows_count = (SELECT count(*) FROM shows '
+            f'WHERE shows.{foreign_key} = {table}.id AND shows.start_time < CURRENT_TIMESTAMP)'
+        )
+
+
+def downgrade():
+    for table in ('venues', 'artists'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('past_shows_count')
+            batch_op.drop_column('upcoming_shows_count')
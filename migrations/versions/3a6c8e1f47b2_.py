@@ -0,0 +1,103 @@
+"""normalize genres into a genres table with artist and venue associations
+
+Revision ID: 3a6c8e1f47b2
+Revises: 8d3f61b4e29a
+Create Date: 2026-10-18 15:02:37.418266
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a6c8e1f47b2'
+down_revision = '8d3f61b4e29a'
+branch_labels = None
+depends_on = None
+
+ENTITIES = (('artists', 'artist_genres', 'artist_id'), ('venues', 'venue_genres', 'venue_id'))
+
+
+def parse_genres(value):
+    """Genre names from the stringified lists the old columns hold, e.g.
+    '{Jazz,"Rock n Roll"}' or "['Jazz', 'Folk']"."""
+    if not value:
+        return []
+    names = (name.strip().strip('{}[]()"\'').strip() for name in value.split(','))
+    return sorted({name for name in names if name})
+
+
+def search_document(*values):
+    return ' '.join(str(value).lower() for value in values if value)
+
+
+def upgrade():
+    genres = op.create_table(
+        'genres',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    for table, association, foreign_key in ENTITIES:
+        op.create_table(
+            association,
+            sa.Column('genre_id', sa.Integer(), nullable=False),
+            sa.Column(foreign_key, sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['genre_id'], ['genres.id'], ),
+            sa.ForeignKeyConstraint([foreign_key], [f'{table}.id'], ),
+            sa.PrimaryKeyConstraint('genre_id', foreign_key)
+        )
+        op.create_index(f'ix_{association}_{foreign_key}', association, [foreign_key], unique=False)
+
+    connection = op.get_bind()
+    rows = {}
+    for table, _, _ in ENTITIES:
+        rows[table] = connection.execute(
+            sa.text(f'SELECT id, name, city, state, genres FROM {table}')).fetchall()
+
+    names = sorted({name for table_rows in rows.values() for row in table_rows
+                    for name in parse_genres(row.genres)})
+    if names:
+        op.bulk_insert(genres, [{'name': name} for name in names])
+    genre_ids = dict(connection.execute(sa.text('SELECT name, id FROM genres')).fetchall())
+
+    for table, association, foreign_key in ENTITIES:
+        links = []
+        documents = []
+        for row in rows[table]:
+            row_genres = parse_genres(row.genres)
+            links.extend({'genre_id': genre_ids[name], foreign_key: row.id} for name in row_genres)
+            documents.append({'entity_id': row.id, 'search_text': search_document(
+                row.name, row.city, row.state, *row_genres)})
+        if links:
+            op.bulk_insert(sa.table(association, sa.column('genre_id'), sa.column(foreign_key)), links)
+        if documents:
+            connection.execute(
+                sa.text(f'UPDATE {table} SET search_text = :search_text WHERE id = :entity_id'),
+                documents)
+
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('genres')
+
+
+def downgrade():
+    connection = op.get_bind()
+    for table, association, foreign_key in reversed(ENTITIES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+
+        values = {}
+        for entity_id, name in connection.execute(sa.text(
+                f'SELECT {association}.{foreign_key}, genres.name FROM {association} '
+                f'JOIN genres ON genres.id = {association}.genre_id ORDER BY genres.name')):
+            values.setdefault(entity_id, []).append(name)
+        if values:
+            connection.execute(
+                sa.text(f'UPDATE {table} SET genres = :genres WHERE id = :entity_id'),
+                [{'entity_id': entity_id, 'genres': '{' + ','.join(names) + '}'}
+                 for entity_id, names in values.items()])
+
+        op.drop_index(f'ix_{association}_{foreign_key}', table_name=association)
+        op.drop_table(association)
+    op.drop_table('genres')
@@ -0,0 +1,45 @@
+"""add precomputed search_text to artists and venues
+
+Revision ID: 5e0a93d2c7b8
+Revises: c41d8a7f5e62
+Create Date: 2026-10-18 11:26:54.702311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0a93d2c7b8'
+down_revision = 'c41d8a7f5e62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('artists', 'venues'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('search_text', sa.Text(), nullable=True))
+
+        op.execute(
+            f"UPDATE {table} SET search_text = lower("
+            f"coalesce(name, '') || ' ' || coalesce(city, '') || ' ' || "
+            f"coalesce(state, '') || ' ' || coalesce(genres, ''))"
+        )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_artists_search_text_trgm', 'artists', ['search_text'],
+                        postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'})
+        op.create_index('ix_venues_search_text_trgm', 'venues', ['search_text'],
+                        postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_venues_search_text_trgm', table_name='venues')
+        op.drop_index('ix_artists_search_text_trgm', table_name='artists')
+
+    for table in ('venues', 'artists'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('search_text')
@@ -0,0 +1,31 @@
+"""add updated_at versions to artists, venues and shows
+
+Revision ID: 8d3f61b4e29a
+Revises: 5e0a93d2c7b8
+Create Date: 2026-10-18 13:40:02.861950
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3f61b4e29a'
+down_revision = '5e0a93d2c7b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('artists', 'venues', 'shows'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                          server_default=sa.text('CURRENT_TIMESTAMP')))
+            batch_op.create_index(f'ix_{table}_updated_at', ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('shows', 'venues', 'artists'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_updated_at')
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,39 @@
+"""add end_time to shows
+
+Revision ID: 9b2d5f7a1c36
+Revises: 3a6c8e1f47b2
+Create Date: 2026-10-18 16:21:48.093517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2d5f7a1c36'
+down_revision = '3a6c8e1f47b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('shows', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('end_time', sa.DateTime(), nullable=True))
+
+    # Existing shows get the default duration of two hours.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("UPDATE shows SET end_time = start_time + interval '2 hours'")
+    else:
+        op.execute("UPDATE shows SET end_time = datetime(start_time, '+2 hours')")
+
+    with op.batch_alter_table('shows', schema=None) as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_check_constraint('ck_shows_end_time_after_start_time', 'end_time > start_time')
+
+
+def downgrade():
+    # SQLite doesn't reflect check constraints; rebuilding the table drops it.
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('ck_shows_end_time_after_start_time', 'shows', type_='check')
+    with op.batch_alter_table('shows', schema=None) as batch_op:
+        batch_op.drop_column('end_time')
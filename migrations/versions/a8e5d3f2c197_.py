@@ -0,0 +1,33 @@
+"""add latitude, longitude and geo_cell to venues
+
+Revision ID: a8e5d3f2c197
+Revises: f3c9a1d6b274
+Create Date: 2026-10-18 20:31:44.208519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8e5d3f2c197'
+down_revision = 'f3c9a1d6b274'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('venues', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('geo_cell', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_venues_geo_cell', ['geo_cell'], unique=False)
+    # Existing venues are located by `flask geocode-venues`.
+
+
+def downgrade():
+    with op.batch_alter_table('venues', schema=None) as batch_op:
+        batch_op.drop_index('ix_venues_geo_cell')
+        batch_op.drop_column('geo_cell')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
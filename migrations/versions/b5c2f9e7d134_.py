@@ -0,0 +1,35 @@
+"""index the keyset pagination keys with NULL names and places as ''
+
+Revision ID: b5c2f9e7d134
+Revises: d6b1e8c4a925
+Create Date: 2026-10-19 09:42:17.305816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5c2f9e7d134'
+down_revision = 'd6b1e8c4a925'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_artists_name_key', 'artists', [sa.text("coalesce(name, '')"), 'id'], unique=False)
+    op.create_index('ix_venues_name_key', 'venues', [sa.text("coalesce(name, '')"), 'id'], unique=False)
+    op.create_index('ix_venues_area_key', 'venues',
+                    [sa.text("coalesce(city, '')"), sa.text("coalesce(state, '')"), sa.text("coalesce(name, '')"), 'id'],
+                    unique=False)
+    # Pages are no longer ordered by the bare columns.
+    op.drop_index('ix_artists_name_id', table_name='artists')
+    op.drop_index('ix_venues_name_id', table_name='venues')
+
+
+def downgrade():
+    op.create_index('ix_venues_name_id', 'venues', ['name', 'id'], unique=False)
+    op.create_index('ix_artists_name_id', 'artists', ['name', 'id'], unique=False)
+    op.drop_index('ix_venues_area_key', table_name='venues')
+    op.drop_index('ix_venues_name_key', table_name='venues')
+    op.drop_index('ix_artists_name_key', table_name='artists')
@@ -0,0 +1,50 @@
+"""add indexes for show, listing and name search access paths
+
+Revision ID: c41d8a7f5e62
+Revises: 2b7c4e91a0d3
+Create Date: 2026-10-18 10:03:11.540217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d8a7f5e62'
+down_revision = '2b7c4e91a0d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'])
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'])
+    op.create_index('ix_shows_start_time', 'shows', ['start_time'])
+
+    op.create_index('ix_artists_name_id', 'artists', ['name', 'id'])
+    op.create_index('ix_artists_city_state', 'artists', ['city', 'state'])
+    op.create_index('ix_venues_name_id', 'venues', ['name', 'id'])
+    op.create_index('ix_venues_city_state_name', 'venues', ['city', 'state', 'name', 'id'])
+
+    # Trigram indexes let `name ILIKE '%term%'` use an index scan.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_artists_name_trgm', 'artists', ['name'],
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+        op.create_index('ix_venues_name_trgm', 'venues', ['name'],
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_venues_name_trgm', table_name='venues')
+        op.drop_index('ix_artists_name_trgm', table_name='artists')
+
+    op.drop_index('ix_venues_city_state_name', table_name='venues')
+    op.drop_index('ix_venues_name_id', table_name='venues')
+    op.drop_index('ix_artists_city_state', table_name='artists')
+    op.drop_index('ix_artists_name_id', table_name='artists')
+
+    op.drop_index('ix_shows_start_time', table_name='shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
@@ -0,0 +1,33 @@
+"""add the matches table
+
+Revision ID: d6b1e8c4a925
+Revises: a8e5d3f2c197
+Create Date: 2026-10-18 22:14:05.873321
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6b1e8c4a925'
+down_revision = 'a8e5d3f2c197'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('matches',
+    sa.Column('kind', sa.String(length=6), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('match_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'owner_id', 'rank')
+    )
+    # Existing artists and venues get their matches from `flask rebuild-matches`.
+
+
+def downgrade():
+    op.drop_table('matches')
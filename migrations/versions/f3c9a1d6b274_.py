@@ -0,0 +1,100 @@
+"""partition shows by month of start_time
+
+Postgres only: shows becomes a table partitioned by range of start_time,
+with a partition per month from the first show to a year ahead, and
+shows_default for everything else. A partitioned table's primary key has
+to include the partition key, so it becomes (id, start_time); ids still
+come from the same sequence. Needs Postgres 11 or later. Other databases
+keep a plain table.
+
+Revision ID: f3c9a1d6b274
+Revises: e4a7b2c9d851
+Create Date: 2026-10-18 19:12:05.662184
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c9a1d6b274'
+down_revision = 'e4a7b2c9d851'
+branch_labels = None
+depends_on = None
+
+COLUMNS = 'id, artist_id, venue_id, start_time, end_time, updated_at'
+INDEXES = [
+    ('ix_shows_venue_id_start_time', 'venue_id, start_time'),
+    ('ix_shows_artist_id_start_time', 'artist_id, start_time'),
+    ('ix_shows_start_time', 'start_time'),
+    ('ix_shows_updated_at', 'updated_at'),
+]
+
+
+def _set_aside_shows():
+    # Frees the names of the table, its indexes and the sequence's owner.
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY NONE')
+    op.execute('ALTER TABLE shows RENAME TO shows_old')
+    op.execute('ALTER TABLE shows_old RENAME CONSTRAINT shows_pkey TO shows_old_pkey')
+    for name, _ in INDEXES:
+        op.execute(f'DROP INDEX {name}')
+
+
+def _create_shows(primary_key, partition_by=''):
+    op.execute(f"""
+        CREATE TABLE shows (
+            id integer NOT NULL DEFAULT nextval('shows_id_seq'),
+            artist_id integer NOT NULL REFERENCES artists (id),
+            venue_id integer NOT NULL REFERENCES venues (id),
+            start_time timestamp without time zone NOT NULL,
+            end_time timestamp without time zone NOT NULL,
+            updated_at timestamp without time zone NOT NULL,
+            CONSTRAINT shows_pkey PRIMARY KEY ({primary_key}),
+            CONSTRAINT ck_shows_end_time_after_start_time CHECK (end_time > start_time)
+        ) {partition_by}
+    """)
+    for name, columns in INDEXES:
+        op.execute(f'CREATE INDEX {name} ON shows ({columns})')
+
+
+def _move_shows():
+    op.execute(f'INSERT INTO shows ({COLUMNS}) SELECT {COLUMNS} FROM shows_old')
+    op.execute('DROP TABLE shows_old')
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY shows.id')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    _set_aside_shows()
+    _create_shows('id, start_time', 'PARTITION BY RANGE (start_time)')
+    op.execute("""
+        DO $$
+        DECLARE
+            month timestamp;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', LEAST(MIN(start_time), now()::timestamp)),
+                    date_trunc('month', now()::timestamp) + interval '12 months',
+                    interval '1 month')
+                FROM shows_old
+            LOOP
+                EXECUTE format('CREATE TABLE %I PARTITION OF shows FOR VALUES FROM (%L) TO (%L)',
+                               'shows_' || to_char(month, 'YYYY_MM'), month, month + interval '1 month');
+            END LOOP;
+        END
+        $$
+    """)
+    op.execute('CREATE TABLE shows_default PARTITION OF shows DEFAULT')
+    _move_shows()
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    _set_aside_shows()
+    _create_shows('id')
+    # Dropping the partitioned table drops its partitions.
+    _move_shows()
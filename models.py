@@ -1,23 +1,104 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import GenericFunction
+
+import geo
+from replicas import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
+
+
+class string_agg(GenericFunction):
+    """string_agg(value, separator), compiled to group_concat on SQLite."""
+    type = db.String()
+
+
+@compiles(string_agg, 'sqlite')
+def _sqlite_string_agg(element, compiler, **kw):
+    return 'group_concat(%s)' % compiler.process(element.clauses, **kw)
+
+
+def search_document(*values):
+    """Lower-cased text that name search matches against."""
+    words = []
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            words.append(search_document(*value))
+        elif value:
+            words.append(str(value).lower())
+    return ' '.join(word for word in words if word)
+
+
+artist_genres = db.Table(
+    'artist_genres',
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Column('artist_id', db.Integer, db.ForeignKey('artists.id'), primary_key=True),
+    db.Index('ix_artist_genres_artist_id', 'artist_id'),
+)
+
+venue_genres = db.Table(
+    'venue_genres',
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Column('venue_id', db.Integer, db.ForeignKey('venues.id'), primary_key=True),
+    db.Index('ix_venue_genres_venue_id', 'venue_id'),
+)
+
+
+class Genre(db.Model):
+    __tablename__ = 'genres'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    @classmethod
+    def ids(cls, names):
+        """Map each of `names` to its genre id, adding the genres that don't exist yet."""
+        names = {name for name in names if name}
+        if not names:
+            return {}
+        ids = dict(db.session.query(cls.name, cls.id).filter(cls.name.in_(names)))
+        missing = names - ids.keys()
+        if missing:
+            db.session.execute(cls.__table__.insert(), [{'name': name} for name in missing])
+            ids.update(db.session.query(cls.name, cls.id).filter(cls.name.in_(missing)))
+        return ids
+
+    @classmethod
+    def named(cls, names):
+        ids = cls.ids(names)
+        return cls.query.filter(cls.id.in_(ids.values())).order_by(cls.name).all() if ids else []
+
+    def __repr__(self):
+        return f'<Genre {self.id} {self.name}>'
 
-db = SQLAlchemy()
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_city_state', 'city', 'state'),
+        db.Index('ix_artists_name_trgm', 'name',
+                 postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artists_search_text_trgm', 'search_text',
+                 postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(120))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    search_text = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+    genres = db.relationship('Genre', secondary=artist_genres, lazy=True, order_by=Genre.name)
     shows = db.relationship('Show', backref='artist', lazy=True)
 
     def __repr__(self):
@@ -26,6 +107,13 @@ class Artist(db.Model):
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_city_state_name', 'city', 'state', 'name', 'id'),
+        db.Index('ix_venues_name_trgm', 'name',
+                 postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venues_search_text_trgm', 'search_text',
+                 postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -33,26 +121,142 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(120))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    search_text = db.Column(db.Text)
+    # Geocoded from the address by the offline gazetteer; see geo.py.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geo_cell = db.Column(db.Integer, index=True)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    genres = db.relationship('Genre', secondary=venue_genres, lazy=True, order_by=Genre.name)
     shows = db.relationship('Show', backref='venue', lazy=True)
 
     def __repr__(self):
         return f'<Venue {self.id} {self.name}>'
 
+
+def _key_index(name, table, *columns):
+    """Index on `columns` of `table` as keyset pages order them (pagination.sort_key)."""
+    db.Index(name, *(db.func.coalesce(table.c[column], db.literal_column("''")) if column != 'id'
+                     else table.c[column] for column in columns))
+
+
+_key_index('ix_artists_name_key', Artist.__table__, 'name', 'id')
+_key_index('ix_venues_name_key', Venue.__table__, 'name', 'id')
+_key_index('ix_venues_area_key', Venue.__table__, 'city', 'state', 'name', 'id')
+
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+# No show runs longer, which bounds the start_time range an overlap check scans.
+MAX_SHOW_DURATION = timedelta(hours=12)
+
+
+def _default_end_time(context):
+    return context.get_current_parameters()['start_time'] + DEFAULT_SHOW_DURATION
+
+
 class Show(db.Model):
+    # On Postgres the table is partitioned by month of start_time and its
+    # primary key is (id, start_time); see partitions.py.
     __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time', 'start_time'),
+        db.CheckConstraint('end_time > start_time', name='ck_shows_end_time_after_start_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
     start_time = db.Column(db.DateTime, default=datetime.now(), nullable=False)
+    end_time = db.Column(db.DateTime, default=_default_end_time, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Show {self.id} {self.artist_id} {self.venue_id} {self.start_time} {self.end_time}>'
+
+
+class Job(db.Model):
+    """Background work queued by the web workers and run by `flask worker`."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    # Enqueuing a key that is already in the table is a no-op.
+    idempotency_key = db.Column(db.String(200), unique=True)
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
 
     def __repr__(self):
-        return f'<Show {self.id} {self.artist_id} {self.venue_id} {self.start_time}>'
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+
+class Match(db.Model):
+    """A suggested venue of an artist (kind 'artist') or artist of a venue
+    (kind 'venue'), kept up to date by matches.py."""
+    __tablename__ = 'matches'
+
+    kind = db.Column(db.String(6), primary_key=True)
+    owner_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    match_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Match {self.kind} {self.owner_id} #{self.rank} {self.match_id}>'
+
+
+GENRE_ASSOCIATIONS = {
+    Artist: (artist_genres, artist_genres.c.artist_id),
+    Venue: (venue_genres, venue_genres.c.venue_id),
+}
+
+
+def genre_names(model):
+    """Correlated subquery with the comma-separated genre names of each row of `model`."""
+    association, foreign_key = GENRE_ASSOCIATIONS[model]
+    return db.select([string_agg(Genre.name, db.literal(','))]).where(
+        db.and_(foreign_key == model.id, Genre.id == association.c.genre_id)
+    ).correlate(model).as_scalar().label('genres')
+
+
+@db.event.listens_for(Artist, 'before_insert')
+@db.event.listens_for(Artist, 'before_update')
+def update_artist_search_text(mapper, connection, artist):
+    artist.search_text = search_document(artist.name, artist.city, artist.state,
+                                         [genre.name for genre in artist.genres])
+
+
+@db.event.listens_for(Venue, 'before_insert')
+@db.event.listens_for(Venue, 'before_update')
+def update_venue_search_text(mapper, connection, venue):
+    venue.search_text = search_document(venue.name, venue.city, venue.state,
+                                        [genre.name for genre in venue.genres])
+
 
+@db.event.listens_for(Venue, 'before_insert')
+@db.event.listens_for(Venue, 'before_update')
+def update_venue_location(mapper, connection, venue):
+    for column, value in geo.location(venue.address, venue.city, venue.state).items():
+        setattr(venue, column, value)
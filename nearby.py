@@ -0,0 +1,148 @@
+"""Venues near a point: radius and nearest-N search.
+
+`GET /venues/near?lat=..&lon=..` (or `?city=..&state=..`, located with
+the gazetteer) answers the venues within `radius` km, nearest first, or
+with no radius the `limit` nearest ones within MAX_RADIUS_KM. Candidates
+come from range scans of the grid cells around the point (see geo.py);
+only their exact distances are computed here.
+"""
+import click
+from flask import Blueprint, jsonify, request
+from flask.cli import with_appcontext
+from sqlalchemy import or_
+
+import geo
+import profiling
+import replicas
+from models import db, Venue
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_RADIUS_KM = 500
+# Nearest-N searches start here and double the radius until enough are found.
+FIRST_RADIUS_KM = 25
+
+bp = Blueprint('nearby', __name__)
+
+
+def within(latitude, longitude, radius_km):
+    """Venues within `radius_km` of the point, nearest first, as (distance, row)."""
+    south, west, north, east = geo.bounding_box(latitude, longitude, radius_km)
+    rows = db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.address,
+        Venue.city,
+        Venue.state,
+        Venue.latitude,
+        Venue.longitude,
+        Venue.upcoming_shows_count
+    ).filter(
+        or_(*(Venue.geo_cell.between(first, last) for first, last in geo.cell_ranges(south, west, north, east))),
+        Venue.latitude.between(south, north),
+        Venue.longitude.between(west, east)
+    )
+    found = []
+    for row in rows:
+        distance = geo.distance_km(latitude, longitude, row.latitude, row.longitude)
+        if distance <= radius_km:
+            found.append((distance, row))
+    # Venues located by city share a point: the busier ones come first.
+    found.sort(key=lambda item: (item[0], -item[1].upcoming_shows_count, item[1].id))
+    return found
+
+
+def nearest(latitude, longitude, limit=DEFAULT_LIMIT, radius_km=None):
+    """The `limit` nearest venues within `radius_km` (default MAX_RADIUS_KM)."""
+    if radius_km is not None:
+        return within(latitude, longitude, radius_km)[:limit], radius_km
+
+    radius_km = FIRST_RADIUS_KM
+    while True:
+        # Everything within the radius is in, so its first `limit` are the nearest overall.
+        found = within(latitude, longitude, radius_km)
+        if len(found) >= limit or radius_km >= MAX_RADIUS_KM:
+            return found[:limit], radius_km
+        radius_km = min(radius_km * 2, MAX_RADIUS_KM)
+
+
+def _float_arg(name, low, high):
+    value = request.args.get(name, type=float)
+    if value is None or not low <= value <= high:
+        raise ValueError(f'{name} must be a number from {low} to {high}.')
+    return value
+
+
+@bp.route('/venues/near')
+@replicas.read_only
+@profiling.query_budget(6)
+def venues_near():
+    try:
+        if request.args.get('city'):
+            point = geo.locate(request.args.get('address'), request.args['city'], request.args.get('state'))
+            if point is None:
+                raise ValueError('Unknown city; pass lat and lon instead.')
+            latitude, longitude = point
+        else:
+            latitude = _float_arg('lat', -90, 90)
+            longitude = _float_arg('lon', -180, 180)
+        radius_km = _float_arg('radius', 0, MAX_RADIUS_KM) if request.args.get('radius') else None
+        limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+        if not 1 <= limit <= MAX_LIMIT:
+            raise ValueError(f'limit must be from 1 to {MAX_LIMIT}.')
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    found, searched_km = nearest(latitude, longitude, limit, radius_km)
+    return jsonify(
+        origin={'latitude': latitude, 'longitude': longitude},
+        radius_km=searched_km,
+        venues=[{
+            'id': venue.id,
+            'name': venue.name,
+            'address': venue.address,
+            'city': venue.city,
+            'state': venue.state,
+            'latitude': venue.latitude,
+            'longitude': venue.longitude,
+            'distance_km': round(distance, 2),
+            'num_upcoming_shows': venue.upcoming_shows_count,
+        } for distance, venue in found]
+    )
+
+
+def geocode_venues(only_missing=True):
+    """Locate the venues (by default those without a location). Returns how many were located."""
+    located = 0
+    last_id = 0
+    while True:
+        query = db.session.query(Venue.id, Venue.address, Venue.city, Venue.state).filter(Venue.id > last_id)
+        if only_missing:
+            query = query.filter(Venue.latitude.is_(None))
+        batch = query.order_by(Venue.id).limit(1000).all()
+        if not batch:
+            break
+        for venue_id, address, city, state in batch:
+            location = geo.location(address, city, state)
+            if location['latitude'] is not None:
+                located += 1
+            # Keeps updated_at, and so the page versions: the pages don't show locations.
+            db.session.execute(Venue.__table__.update().where(Venue.id == venue_id).values(
+                updated_at=Venue.updated_at, **location))
+        last_id = batch[-1][0]
+        db.session.commit()
+    return located
+
+
+@click.command('geocode-venues')
+@click.option('--all', 'everything', is_flag=True, help='Locate every venue again, not only the missing ones.')
+@with_appcontext
+def geocode_venues_command(everything):
+    """Locate venues with the offline gazetteer."""
+    located = geocode_venues(only_missing=not everything)
+    click.echo(f'Located {located} venues.')
+
+
+def init_app(app):
+    app.register_blueprint(bp)
+    app.cli.add_command(geocode_venues_command)
@@ -0,0 +1,99 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import abort, request
+from sqlalchemy import String, func, literal_column, tuple_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def sort_key(columns):
+    """`columns` as pages are ordered and compared by.
+
+    A row comparison involving NULL is never true, so rows with a NULL in a
+    nullable text column would be skipped; those compare as '' instead
+    (see the matching expression indexes in models.py).
+    """
+    # A literal '', not a parameter, so the expression matches the index.
+    return [func.coalesce(column, literal_column("''")) if column.nullable and isinstance(column.type, String) else column
+            for column in (column.expression for column in columns)]
+
+
+def encode_cursor(values):
+    # Key values are only NULL in text columns, which sort_key() reads as ''.
+    values = [value.isoformat() if isinstance(value, datetime) else '' if value is None else value
+              for value in values]
+    payload = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursor(cursor) from e
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor(cursor)
+
+    decoded = []
+    for column, value in zip(columns, values):
+        python_type = column.type.python_type
+        if python_type is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError) as e:
+                raise InvalidCursor(cursor) from e
+        elif not isinstance(value, python_type) or isinstance(value, bool):
+            raise InvalidCursor(cursor)
+        decoded.append(value)
+    return decoded
+
+
+def after_cursor(query, columns, cursor):
+    """Restrict `query` to the rows after `cursor` in the order of sort_key(columns)."""
+    return query.filter(tuple_(*sort_key(columns)) > tuple_(*decode_cursor(cursor, columns)))
+
+
+def page_limit(limit, default=DEFAULT_LIMIT):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return default
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def keyset_page(query, columns, cursor=None, limit=None):
+    """Fetch one page of `query` ordered by the unique key `columns`.
+
+    Rows strictly after `cursor` (as returned in the previous page) are
+    fetched with a row-value comparison, so any page costs the same index
+    range scan however deep it is. Returns the rows and the cursor of the
+    next page, or None on the last page.
+    """
+    limit = page_limit(limit)
+    if cursor:
+        query = after_cursor(query, columns, cursor)
+
+    rows = query.order_by(*sort_key(columns)).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, column.key) for column in columns])
+
+
+def request_page(query, columns):
+    """keyset_page() for the `after`/`limit` of the current request; 400 on a bad cursor."""
+    try:
+        return keyset_page(query, columns, request.args.get('after'), request.args.get('limit'))
+    except InvalidCursor:
+        abort(400)
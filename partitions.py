@@ -0,0 +1,187 @@
+"""Monthly range partitions of the shows table on Postgres.
+
+The shows table is partitioned by start_time: one partition per month
+(shows_2026_10) and shows_default for rows outside all of them. Queries
+that bound start_time, like those built with upcoming(), only touch the
+partitions that can match, so looking up upcoming shows reads the
+current month and the ones ahead however many years of history pile up.
+
+`flask shows-partitions`, run from cron (daily is plenty):
+- creates the partitions of the next MONTHS_AHEAD months, moving any
+  rows that landed in shows_default into them;
+- compacts the months of each year older than COMPACT_AFTER_MONTHS into
+  one yearly partition (shows_2023), optionally in another tablespace,
+  so the number of partitions stays small as the history grows.
+
+On other databases shows is a plain table: the query helpers still work
+and the command does nothing.
+"""
+import re
+from collections import namedtuple
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from models import db, Show
+
+DEFAULT_PARTITION = 'shows_default'
+MONTHS_AHEAD = 12
+COMPACT_AFTER_MONTHS = 24
+
+Partition = namedtuple('Partition', 'name start end')
+
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def upcoming(now=None):
+    """Criterion for the shows starting at or after `now`."""
+    return Show.start_time >= (now or datetime.now())
+
+
+def past(now=None):
+    """Criterion for the shows that started before `now`."""
+    return Show.start_time < (now or datetime.now())
+
+
+def month_start(when):
+    return datetime(when.year, when.month, 1)
+
+
+def add_months(when, months):
+    month = when.month - 1 + months
+    return datetime(when.year + month // 12, month % 12 + 1, 1)
+
+
+def partitioned():
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return False
+    return db.session.execute(text(
+        "SELECT relkind FROM pg_class WHERE oid = 'shows'::regclass")).scalar() == 'p'
+
+
+def partitions():
+    """The range partitions of shows, oldest first (shows_default excluded)."""
+    rows = db.session.execute(text(
+        'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = 'shows'::regclass"))
+    found = []
+    for name, bound in rows:
+        match = _BOUND.search(bound)
+        if match:
+            found.append(Partition(name, datetime.fromisoformat(match[1]), datetime.fromisoformat(match[2])))
+    return sorted(found, key=lambda partition: partition.start)
+
+
+def _range(start, end):
+    return {'start': start, 'end': end}
+
+
+def _create(name, start, end):
+    bounds = f"FOR VALUES FROM ('{start.isoformat(' ')}') TO ('{end.isoformat(' ')}')"
+    stray = db.session.execute(text(
+        f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE start_time >= :start AND start_time < :end)'),
+        _range(start, end)).scalar()
+    if not stray:
+        db.session.execute(text(f'CREATE TABLE {name} PARTITION OF shows {bounds}'))
+        return
+
+    # A partition can't be added while shows_default holds rows of its range.
+    db.session.execute(text(f'ALTER TABLE shows DETACH PARTITION {DEFAULT_PARTITION}'))
+    db.session.execute(text(f'CREATE TABLE {name} PARTITION OF shows {bounds}'))
+    db.session.execute(text(
+        f'INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE start_time >= :start AND start_time < :end'),
+        _range(start, end))
+    db.session.execute(text(
+        f'DELETE FROM {DEFAULT_PARTITION} WHERE start_time >= :start AND start_time < :end'), _range(start, end))
+    db.session.execute(text(f'ALTER TABLE shows ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT'))
+
+
+def create_partitions(ahead=MONTHS_AHEAD, now=None):
+    """Add the missing monthly partitions up to `ahead` months from now. Returns their names."""
+    existing = partitions()
+    month = month_start(now or datetime.now())
+    created = []
+    for _ in range(ahead + 1):
+        end = add_months(month, 1)
+        if not any(partition.start < end and month < partition.end for partition in existing):
+            name = f'shows_{month:%Y_%m}'
+            _create(name, month, end)
+            created.append(name)
+        month = end
+    db.session.commit()
+    return created
+
+
+def _compact_year(year, months, tablespace=None):
+    name = f'shows_{year}'
+    start, end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    # Writes to these months (and to shows_default, which may hold rows of
+    # the year) wait until the swap is done. Reads go on until the first
+    # DETACH, which locks shows exclusively; everything that scans rows is
+    # done before it, so that lock is held for catalog changes and ATTACH's
+    # check of shows_default, which create_partitions keeps small.
+    for month in months:
+        db.session.execute(text(f'LOCK TABLE {month.name} IN SHARE MODE'))
+    db.session.execute(text(f'LOCK TABLE {DEFAULT_PARTITION} IN SHARE MODE'))
+    db.session.execute(text(
+        f'CREATE TABLE {name} (LIKE shows INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        + (f' TABLESPACE {tablespace}' if tablespace else '')))
+    db.session.execute(text(
+        f'INSERT INTO {name} SELECT * FROM shows WHERE start_time >= :start AND start_time < :end'),
+        _range(start, end))
+    # Validated now, on a table nothing reads yet; with the range proven,
+    # ATTACH skips scanning the table.
+    db.session.execute(text(
+        f'ALTER TABLE {name} ADD CONSTRAINT {name}_range CHECK (start_time >= :start AND start_time < :end)'),
+        _range(start, end))
+    db.session.execute(text(
+        f'DELETE FROM {DEFAULT_PARTITION} WHERE start_time >= :start AND start_time < :end'), _range(start, end))
+    for month in months:
+        db.session.execute(text(f'ALTER TABLE shows DETACH PARTITION {month.name}'))
+        db.session.execute(text(f'DROP TABLE {month.name}'))
+    db.session.execute(text(
+        f"ALTER TABLE shows ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start.isoformat(' ')}') TO ('{end.isoformat(' ')}')"))
+    db.session.execute(text(f'ALTER TABLE {name} DROP CONSTRAINT {name}_range'))
+    db.session.commit()
+
+    # Old shows don't change anymore: freeze them once instead of on every
+    # anti-wraparound vacuum.
+    with db.get_engine().connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.execute(text(f'VACUUM (FREEZE, ANALYZE) {name}'))
+    return name
+
+
+def compact(after=COMPACT_AFTER_MONTHS, tablespace=None, now=None):
+    """Merge the monthly partitions of years older than `after` months into yearly ones."""
+    cutoff = add_months(month_start(now or datetime.now()), -after)
+    years = {}
+    for partition in partitions():
+        monthly = partition.end <= add_months(partition.start, 1)
+        if monthly and partition.start.year < cutoff.year:
+            years.setdefault(partition.start.year, []).append(partition)
+    return [_compact_year(year, months, tablespace) for year, months in sorted(years.items())]
+
+
+@click.command('shows-partitions')
+@click.option('--ahead', default=MONTHS_AHEAD, show_default=True,
+              help='Months ahead to create partitions for.')
+@click.option('--compact-after', default=COMPACT_AFTER_MONTHS, show_default=True,
+              help='Months after which past shows are compacted into yearly partitions.')
+@click.option('--tablespace', help='Tablespace for the compacted partitions.')
+@with_appcontext
+def shows_partitions_command(ahead, compact_after, tablespace):
+    """Create upcoming and compact old partitions of the shows table."""
+    if not partitioned():
+        click.echo('The shows table is not partitioned; nothing to do.')
+        return
+    created = create_partitions(ahead)
+    compacted = compact(compact_after, tablespace)
+    click.echo(f"Created {', '.join(created) or 'no partitions'}; "
+               f"compacted {', '.join(compacted) or 'no years'}.")
+
+
+def init_app(app):
+    app.cli.add_command(shows_partitions_command)
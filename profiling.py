@@ -0,0 +1,171 @@
+"""Per-request SQL and template profiling.
+
+With PROFILING enabled every request records its query count, total DB
+time, slowest statement and template render time. They are reported in the
+X-Query-Count and Server-Timing response headers, and the most recent
+requests are listed at /__perf together with the metrics other extensions
+register in app.extensions['perf_metrics'].
+"""
+import time
+from collections import deque
+from functools import wraps
+
+from flask import current_app, g, has_request_context, jsonify, request, signals
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    def __init__(self, endpoint, count, budget):
+        super().__init__(f'{endpoint} issued {count} queries, over its budget of {budget}')
+        self.endpoint = endpoint
+        self.count = count
+        self.budget = budget
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.query_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.template_time = 0.0
+        self.template_starts = []
+
+    def record_query(self, statement, duration):
+        self.query_count += 1
+        self.query_time += duration
+        if duration >= self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+    def as_dict(self):
+        return {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'query_count': self.query_count,
+            'query_ms': round(self.query_time * 1000, 3),
+            'template_ms': round(self.template_time * 1000, 3),
+            'slowest_query_ms': round(self.slowest_time * 1000, 3),
+            'slowest_query': self.slowest_statement,
+        }
+
+
+def current_profile():
+    if has_request_context():
+        return g.get('profile')
+    return None
+
+
+def query_count():
+    """Number of SQL statements the current request has executed so far."""
+    profile = current_profile()
+    return profile.query_count if profile else 0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile()
+    if profile is not None and conn.info.get('query_started'):
+        profile.record_query(statement, time.perf_counter() - conn.info['query_started'].pop())
+
+
+def _before_render_template(app, template, context):
+    profile = current_profile()
+    if profile is not None:
+        profile.template_starts.append(time.perf_counter())
+
+
+def _template_rendered(app, template, context):
+    profile = current_profile()
+    if profile is not None and profile.template_starts:
+        started = profile.template_starts.pop()
+        if not profile.template_starts:
+            profile.template_time += time.perf_counter() - started
+
+
+def query_budget(budget):
+    """Declare the most SQL statements a view may issue.
+
+    Going over the budget raises QueryBudgetExceeded when QUERY_BUDGET_STRICT
+    is set (it defaults to TESTING) and logs a warning otherwise.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = view(*args, **kwargs)
+            count = query_count()
+            if count > budget:
+                error = QueryBudgetExceeded(request.endpoint, count, budget)
+                if current_app.config.get('QUERY_BUDGET_STRICT', current_app.testing):
+                    raise error
+                current_app.logger.warning(str(error))
+            return response
+        wrapper.query_budget = budget
+        return wrapper
+    return decorator
+
+
+def server_timing(profile):
+    total = (time.perf_counter() - profile.started) * 1000
+    return ', '.join([
+        f'db;dur={profile.query_time * 1000:.2f};desc="{profile.query_count} queries"',
+        f'render;dur={profile.template_time * 1000:.2f}',
+        f'total;dur={total:.2f}',
+    ])
+
+
+def init_app(app):
+    if not app.config.get('PROFILING'):
+        return
+
+    history = deque(maxlen=app.config.get('PROFILING_HISTORY', 200))
+    app.extensions['profiling'] = history
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    if signals.signals_available:
+        signals.before_render_template.connect(_before_render_template, app)
+        signals.template_rendered.connect(_template_rendered, app)
+
+    @app.before_request
+    def start_profile():
+        g.profile = RequestProfile()
+
+    @app.after_request
+    def report_profile(response):
+        profile = current_profile()
+        if profile is None:
+            return response
+        response.headers['X-Query-Count'] = str(profile.query_count)
+        response.headers['Server-Timing'] = server_timing(profile)
+        if request.endpoint != 'perf':
+            history.append(profile.as_dict())
+        return response
+
+    @app.route('/__perf')
+    def perf():
+        requests = list(history)
+        endpoints = {}
+        for entry in requests:
+            stats = endpoints.setdefault(entry['endpoint'], {
+                'requests': 0, 'max_queries': 0, 'total_ms': 0.0, 'query_ms': 0.0
+            })
+            stats['requests'] += 1
+            stats['max_queries'] = max(stats['max_queries'], entry['query_count'])
+            stats['total_ms'] += entry['total_ms']
+            stats['query_ms'] += entry['query_ms']
+        for stats in endpoints.values():
+            stats['avg_ms'] = round(stats.pop('total_ms') / stats['requests'], 3)
+            stats['avg_query_ms'] = round(stats.pop('query_ms') / stats['requests'], 3)
+
+        metrics = {name: collect() for name, collect in app.extensions.get('perf_metrics', {}).items()}
+        return jsonify(endpoints=endpoints, metrics=metrics, requests=requests[::-1])
@@ -0,0 +1,136 @@
+import json
+from contextlib import contextmanager
+from urllib.parse import quote
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+import replicas
+from models import db, Artist, Genre, Venue
+
+
+def _route_requests():
+    """The (method, path, form) requests whose queries are checked."""
+    artist = db.session.query(Artist.id, Artist.name).order_by(Artist.id).first()
+    venue = db.session.query(Venue.id, Venue.name).order_by(Venue.id).first()
+    genre = db.session.query(Genre.name).order_by(Genre.id).first()
+    if artist is None or venue is None or genre is None:
+        raise click.ClickException('Seed the database with artists, venues and shows first.')
+
+    return [
+        ('GET', '/venues', None),
+        ('GET', '/artists', None),
+        ('GET', f'/venues?genre={quote(genre.name)}', None),
+        ('GET', f'/artists?genre={quote(genre.name)}', None),
+        ('GET', '/shows', None),
+        ('GET', f'/artists/{artist.id}', None),
+        ('GET', f'/venues/{venue.id}', None),
+        ('POST', '/artists/search', {'search_term': artist.name[:3]}),
+        ('POST', '/venues/search', {'search_term': venue.name[:3]}),
+    ]
+
+
+@contextmanager
+def capture_selects(engines):
+    """Collect the SELECTs run on each of `engines`, as {engine: [(statement, parameters)]}."""
+    statements = {engine: [] for engine in engines}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith('SELECT'):
+            statements[conn.engine].append((statement, parameters))
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def _postgresql_seq_scans(cursor, statement, parameters):
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scans = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            scans.append(node['Relation Name'])
+        nodes.extend(node.get('Plans', []))
+    return scans
+
+
+def _sqlite_seq_scans(cursor, statement, parameters):
+    cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+    scans = []
+    for row in cursor.fetchall():
+        detail = row[-1]
+        # SCAN CONSTANT ROW is a SELECT without FROM, e.g. of subqueries.
+        if detail.startswith('SCAN ') and 'INDEX' not in detail and detail != 'SCAN CONSTANT ROW':
+            scans.append(detail.split()[1])
+    return scans
+
+
+def seq_scans(engine, statements):
+    """Yield (statement, tables) for every statement planned with a sequential scan.
+
+    On PostgreSQL sequential scans are disabled for the session first, so a
+    seq scan in the plan means no index can serve the query at all rather
+    than that the seeded table is small enough for the planner to prefer one.
+    """
+    if engine.dialect.name == 'postgresql':
+        explain = _postgresql_seq_scans
+    elif engine.dialect.name == 'sqlite':
+        explain = _sqlite_seq_scans
+    else:
+        raise click.ClickException(f'EXPLAIN is not supported for {engine.dialect.name}.')
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if engine.dialect.name == 'postgresql':
+            cursor.execute('SET enable_seqscan = off')
+        for statement, parameters in statements:
+            tables = explain(cursor, statement, parameters)
+            if tables:
+                yield statement, tables
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans_command():
+    """EXPLAIN every query issued by the read routes and fail on sequential scans."""
+    app = current_app._get_current_object()
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+
+    failures = 0
+    for method, path, form in _route_requests():
+        # The read-only routes query the replicas when there are any.
+        with capture_selects(replicas.engines(app)) as captured:
+            response = client.open(path, method=method, data=form)
+        if response.status_code != 200:
+            raise click.ClickException(f'{method} {path} returned {response.status_code}.')
+
+        for engine, statements in captured.items():
+            for statement, tables in seq_scans(engine, statements):
+                failures += 1
+                click.echo(f'{method} {path}: sequential scan on {", ".join(tables)}')
+                click.echo('    ' + ' '.join(statement.split()))
+
+    if failures:
+        raise click.ClickException(f'{failures} queries fall back to a sequential scan.')
+    click.echo('No route query falls back to a sequential scan.')
+
+
+def init_app(app):
+    app.cli.add_command(check_query_plans_command)
@@ -0,0 +1,91 @@
+"""Read replica routing.
+
+Views marked with @read_only (the listings, detail pages, search and the
+API reads) run their queries on one of the replicas in
+SQLALCHEMY_REPLICA_URIS, picked at random per request. Everything else,
+and any flush or INSERT/UPDATE/DELETE, goes to the primary.
+
+Replicas lag behind the primary, so a client that has just written (any
+non-GET request that committed) reads from the primary for
+REPLICA_STICKY_SECONDS after: following edit_artist_submission's redirect
+to show_artist shows the edit. The deadline is kept in the session cookie,
+so it holds across workers. Without replicas configured nothing changes.
+"""
+import random
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import event, orm
+from sqlalchemy.sql.expression import UpdateBase
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_KEY = '_primary_until'
+
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('db_replica') if has_request_context() else None
+        if replica is None or self._flushing or isinstance(clause, UpdateBase):
+            return super().get_bind(mapper, clause)
+        return get_state(self.app).db.get_engine(self.app, bind=replica)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(db_session):
+    if has_request_context() and request.method not in SAFE_METHODS:
+        g.db_committed = True
+
+
+def read_only(view):
+    """Let the view read from a replica."""
+    view.read_only = True
+    return view
+
+
+def replica_binds(app):
+    return app.extensions['replicas']
+
+
+def engines(app):
+    """The primary engine followed by the replica engines."""
+    db = get_state(app).db
+    return [db.get_engine(app)] + [db.get_engine(app, bind=bind) for bind in replica_binds(app)]
+
+
+def _route_request():
+    binds = replica_binds(current_app)
+    view = current_app.view_functions.get(request.endpoint)
+    if not binds or not getattr(view, 'read_only', False):
+        return
+    if session.get(STICKY_KEY, 0) > time.time():
+        # Read your own writes; see cache.cached_page.
+        g.read_your_writes = True
+        return
+    g.db_replica = random.choice(binds)
+
+
+def _stick_to_primary(response):
+    if g.get('db_committed') and replica_binds(current_app):
+        session[STICKY_KEY] = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+    return response
+
+
+def init_app(app):
+    uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    replicas = []
+    for number, uri in enumerate(uris):
+        bind = f'replica_{number}'
+        binds[bind] = uri
+        replicas.append(bind)
+    app.config['SQLALCHEMY_BINDS'] = binds or None
+    app.extensions['replicas'] = replicas
+
+    app.before_request(_route_request)
+    app.after_request(_stick_to_primary)
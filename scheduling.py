@@ -0,0 +1,172 @@
+"""Show scheduling: durations and double-booking checks.
+
+A show books its artist and its venue from start_time to end_time. No show
+runs longer than MAX_SHOW_DURATION, so every show that can overlap a slot
+[start, end) starts between start - MAX_SHOW_DURATION and end: checking a
+slot is one bounded range scan of the (venue_id, start_time) and
+(artist_id, start_time) indexes, however many shows there are.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import Blueprint, jsonify, request
+from sqlalchemy import and_, or_
+
+from models import db, Artist, DEFAULT_SHOW_DURATION, MAX_SHOW_DURATION, Show, Venue
+
+MAX_SLOTS = 500
+# Slots per query, to keep the OR of index range scans a reasonable size.
+CHUNK_SIZE = 100
+
+bp = Blueprint('scheduling', __name__)
+
+Slot = namedtuple('Slot', 'artist_id venue_id start_time end_time')
+
+
+class SchedulingConflict(ValueError):
+    def __init__(self, conflicts):
+        super().__init__(' '.join(
+            f"{' and '.join(conflict['booked']).capitalize()} already booked from "
+            f"{conflict['start_time']:%Y-%m-%d %H:%M} to {conflict['end_time']:%Y-%m-%d %H:%M}."
+            for conflict in conflicts))
+        self.conflicts = conflicts
+
+
+def parse_time(value):
+    if isinstance(value, datetime):
+        return value
+    for time_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M'):
+        try:
+            return datetime.strptime(str(value).strip(), time_format)
+        except ValueError:
+            pass
+    raise ValueError(f'Invalid start time {value!r}, expected YYYY-MM-DD HH:MM.')
+
+
+def parse_duration(minutes):
+    """A show duration from a number of minutes; None or '' gives the default."""
+    if minutes is None or minutes == '':
+        return DEFAULT_SHOW_DURATION
+    # Checked before building the timedelta, which overflows on huge values.
+    minutes = int(minutes)
+    max_minutes = int(MAX_SHOW_DURATION.total_seconds()) // 60
+    if not 0 < minutes <= max_minutes:
+        raise ValueError(f'A show lasts between 1 and {max_minutes} minutes.')
+    return timedelta(minutes=minutes)
+
+
+def slot(artist_id, venue_id, start_time, minutes=None):
+    start_time = parse_time(start_time)
+    # The overlap checks look MAX_SHOW_DURATION either side of the start,
+    # which must stay within the datetime range.
+    if not datetime.min + MAX_SHOW_DURATION <= start_time <= datetime.max - MAX_SHOW_DURATION:
+        raise ValueError(f'Start time {start_time} is out of range.')
+    return Slot(int(artist_id), int(venue_id), start_time, start_time + parse_duration(minutes))
+
+
+def overlaps(show, slot):
+    return show.start_time < slot.end_time and show.end_time > slot.start_time
+
+
+def _overlapping(column, value, slot):
+    return and_(
+        column == value,
+        Show.start_time > slot.start_time - MAX_SHOW_DURATION,
+        Show.start_time < slot.end_time,
+        Show.end_time > slot.start_time
+    )
+
+
+def _conflict(show, slot):
+    booked = [name for name, taken in (('artist', show.artist_id == slot.artist_id),
+                                       ('venue', show.venue_id == slot.venue_id)) if taken]
+    return {
+        'show_id': show.id,
+        'booked': booked,
+        'start_time': show.start_time,
+        'end_time': show.end_time,
+    }
+
+
+def conflicts(slots):
+    """The existing shows each of `slots` would double-book, as lists of dicts."""
+    results = []
+    for index in range(0, len(slots), CHUNK_SIZE):
+        chunk = slots[index:index + CHUNK_SIZE]
+        conditions = []
+        for candidate in chunk:
+            conditions.append(_overlapping(Show.venue_id, candidate.venue_id, candidate))
+            conditions.append(_overlapping(Show.artist_id, candidate.artist_id, candidate))
+        shows = db.session.query(
+            Show.id, Show.artist_id, Show.venue_id, Show.start_time, Show.end_time
+        ).filter(or_(*conditions)).order_by(Show.start_time, Show.id).all()
+
+        for candidate in chunk:
+            results.append([
+                _conflict(show, candidate) for show in shows
+                if (show.artist_id == candidate.artist_id or show.venue_id == candidate.venue_id)
+                and overlaps(show, candidate)
+            ])
+    return results
+
+
+def book(slot):
+    """Add a show for `slot` unless it double-books its artist or venue.
+
+    The artist and venue rows are locked first (always in that order), so
+    concurrent bookings of either are checked one after the other. Raises
+    LookupError for an unknown artist or venue and SchedulingConflict for
+    an overlap. The caller owns the transaction.
+    """
+    artist = db.session.query(Artist.id).filter(Artist.id == slot.artist_id).with_for_update().first()
+    venue = db.session.query(Venue.id).filter(Venue.id == slot.venue_id).with_for_update().first()
+    if artist is None or venue is None:
+        raise LookupError('Unknown artist or venue.')
+
+    found, = conflicts([slot])
+    if found:
+        raise SchedulingConflict(found)
+
+    show = Show(artist_id=slot.artist_id, venue_id=slot.venue_id,
+                start_time=slot.start_time, end_time=slot.end_time)
+    db.session.add(show)
+    db.session.flush()
+    return show
+
+
+@bp.route('/shows/availability', methods=['POST'])
+def availability():
+    """Check many candidate slots at once.
+
+    Takes {"slots": [{"artist_id", "venue_id", "start_time", "duration"}]},
+    with the duration in minutes, and answers each slot in order with
+    whether it is free and the shows it conflicts with.
+    """
+    payload = request.get_json(silent=True) or {}
+    candidates = payload.get('slots')
+    if not isinstance(candidates, list) or not candidates:
+        return jsonify(error='Post the candidate slots as {"slots": [...]}.'), 400
+    if len(candidates) > MAX_SLOTS:
+        return jsonify(error=f'At most {MAX_SLOTS} slots per request.'), 400
+
+    slots = []
+    for index, candidate in enumerate(candidates):
+        try:
+            slots.append(slot(candidate['artist_id'], candidate['venue_id'], candidate['start_time'],
+                              candidate.get('duration')))
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify(error=f'Slot {index}: {e}'), 400
+
+    return jsonify(slots=[{
+        'artist_id': candidate.artist_id,
+        'venue_id': candidate.venue_id,
+        'start_time': candidate.start_time.isoformat(),
+        'end_time': candidate.end_time.isoformat(),
+        'available': not found,
+        'conflicts': [dict(conflict, start_time=conflict['start_time'].isoformat(),
+                           end_time=conflict['end_time'].isoformat()) for conflict in found],
+    } for candidate, found in zip(slots, conflicts(slots))])
+
+
+def init_app(app):
+    app.register_blueprint(bp)
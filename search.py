@@ -0,0 +1,93 @@
+from flask import request
+from sqlalchemy import case, func
+
+from listings import filtered
+from models import db, Artist, Venue
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def _escape_like(word):
+    return word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _bounded(value, default, upper=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    value = max(value, 0)
+    return min(value, upper) if upper is not None else value
+
+
+def search(model, columns, term, city=None, state=None, genre=None, limit=None, offset=None):
+    """Ranked search over the precomputed `search_text` of artists or venues.
+
+    Every word of `term` has to appear in the name, city, state or genres;
+    with pg_trgm each word is served by the trigram index on `search_text`.
+    Exact and prefix name matches rank first, then trigram similarity.
+    `city`/`state` narrow the results to one area and `genre` to one genre.
+
+    Returns a dict with the total `count`, the requested `limit`/`offset`
+    window of `data` rows and the `next_offset` (None on the last page).
+    """
+    term = (term or '').strip().lower()
+    limit = _bounded(limit, DEFAULT_LIMIT, MAX_LIMIT) or DEFAULT_LIMIT
+    offset = _bounded(offset, 0)
+
+    escaped = _escape_like(term)
+    name = func.lower(model.name)
+    rank = case([
+        (name == term, 3),
+        (name.like(f'{escaped}%', escape='\\'), 2),
+        (name.like(f'%{escaped}%', escape='\\'), 1),
+    ], else_=0)
+    order_by = [rank.desc()]
+    if db.session.bind.dialect.name == 'postgresql':
+        order_by.append(func.similarity(model.search_text, term).desc())
+    order_by.extend([model.name, model.id])
+
+    query = db.session.query(*columns, func.count().over().label('total'))
+    for word in term.split():
+        query = query.filter(model.search_text.like(f'%{_escape_like(word)}%', escape='\\'))
+    query = filtered(query, model, genre=genre, city=city, state=state)
+
+    rows = query.order_by(*order_by).limit(limit).offset(offset).all()
+    if rows:
+        count = rows[0].total
+    elif offset:
+        count = query.with_entities(func.count()).order_by(None).scalar()
+    else:
+        count = 0
+
+    return {
+        'count': count,
+        'data': rows,
+        'limit': limit,
+        'offset': offset,
+        'next_offset': offset + limit if offset + limit < count else None,
+    }
+
+
+def search_artists(term, **options):
+    columns = (Artist.id, Artist.name, Artist.city, Artist.state,
+               Artist.upcoming_shows_count.label('num_upcoming_shows'))
+    return search(Artist, columns, term, **options)
+
+
+def search_venues(term, **options):
+    columns = (Venue.id, Venue.name, Venue.city, Venue.state,
+               Venue.upcoming_shows_count.label('num_upcoming_shows'))
+    return search(Venue, columns, term, **options)
+
+
+def request_options():
+    """search() options from the query string or form of the current request."""
+    return {
+        'city': request.values.get('city'),
+        'state': request.values.get('state'),
+        'genre': request.values.get('genre'),
+        'limit': request.values.get('limit'),
+        'offset': request.values.get('offset'),
+    }
@@ -0,0 +1,214 @@
+"""Synthetic catalogue generator for benchmarks and query plan checks.
+
+`flask seed --shows N` adds N shows with artists and venues scaled to match.
+Popularity is skewed the way real listings are: a few big cities hold most
+venues, and a few venues and artists play most of the shows. Shows run
+from two years back to one year ahead, at most one per venue and per
+artist each night, so they never double-book. The same --seed gives the
+same data. Rows are written with executemany in batches, so memory stays
+flat from 10k to 10M shows.
+"""
+import math
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, text
+
+import counters
+import geo
+from forms import VenueForm
+from models import (db, artist_genres, venue_genres, Artist, Genre, Show, Venue,
+                    search_document)
+
+BATCH_SIZE = 10000
+PAST_DAYS = 730
+FUTURE_DAYS = 365
+SHOWS_PER_ARTIST = 40
+SHOWS_PER_VENUE = 200
+
+# (city, state, relative size)
+CITIES = [
+    ('New York', 'NY', 84), ('Los Angeles', 'CA', 40), ('Chicago', 'IL', 27),
+    ('Houston', 'TX', 23), ('Phoenix', 'AZ', 16), ('Philadelphia', 'PA', 16),
+    ('San Antonio', 'TX', 15), ('San Diego', 'CA', 14), ('Dallas', 'TX', 13),
+    ('Austin', 'TX', 10), ('San Francisco', 'CA', 9), ('Seattle', 'WA', 7),
+    ('Nashville', 'TN', 7), ('Denver', 'CO', 7), ('Boston', 'MA', 7),
+    ('Portland', 'OR', 6), ('New Orleans', 'LA', 4), ('Atlanta', 'GA', 5),
+    ('Miami', 'FL', 5), ('Minneapolis', 'MN', 4),
+]
+WORDS = ['Blue', 'Red', 'Velvet', 'Electric', 'Golden', 'Midnight', 'Silver', 'Wild', 'Lucky',
+         'Neon', 'Crimson', 'Echo', 'Iron', 'Lonely', 'Northern', 'Paper', 'Rolling', 'Static']
+ARTIST_NOUNS = ['Foxes', 'Kings', 'Tides', 'Hearts', 'Owls', 'Riders', 'Saints', 'Wolves',
+                'Machines', 'Rivers', 'Ghosts', 'Brothers', 'Strangers', 'Lights']
+VENUE_NOUNS = ['Hall', 'Room', 'Lounge', 'Club', 'Theatre', 'Ballroom', 'Tavern', 'Stage',
+               'Garden', 'Cellar', 'Warehouse', 'Bar']
+# Relative number of shows from Monday to Sunday.
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.2, 1.5, 2.2, 2.5, 1.3]
+START_HOURS = [18, 19, 19, 20, 20, 20, 21, 21, 22]
+DURATIONS = [60, 90, 90, 120, 120, 120, 150, 180]
+
+
+def _zipf_weights(count, exponent=1.1):
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def _distinct_choices(rng, population, cum_weights, count):
+    """Up to `count` distinct items of `population`, drawn by popularity."""
+    count = min(count, len(population))
+    chosen = set()
+    for _ in range(4):
+        if len(chosen) >= count:
+            break
+        chosen.update(rng.choices(population, cum_weights=cum_weights, k=(count - len(chosen)) * 2))
+    # The tail of the distribution, uniformly, when the popular items are used up.
+    while len(chosen) < count:
+        chosen.add(rng.choice(population))
+    return rng.sample(sorted(chosen), count)
+
+
+def _scattered(rng, city, state):
+    # Spread each city's venues over ~20 km around its centroid.
+    latitude, longitude = geo.locate(city=city, state=state)
+    latitude += rng.uniform(-0.1, 0.1)
+    longitude += rng.uniform(-0.1, 0.1)
+    return {'latitude': latitude, 'longitude': longitude, 'geo_cell': geo.cell(latitude, longitude)}
+
+
+def _max_id(model):
+    return db.session.query(func.coalesce(func.max(model.id), 0)).scalar()
+
+
+def _insert(table, rows):
+    if rows:
+        db.session.execute(table.insert(), rows)
+        rows.clear()
+
+
+def _reset_sequence(model):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(text("SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+                                f"(SELECT max(id) FROM {model.__tablename__}))"),
+                           {'table': model.__tablename__})
+
+
+def _entities(rng, model, association, foreign_key, count, genre_ids, build):
+    first_id = _max_id(model) + 1
+    city_weights = list(accumulate(size for _, _, size in CITIES))
+    rows = []
+    links = []
+    for entity_id in range(first_id, first_id + count):
+        city, state, _ = rng.choices(CITIES, cum_weights=city_weights)[0]
+        genres = rng.sample(sorted(genre_ids), rng.choice([1, 1, 2, 2, 3]))
+        row = build(entity_id, city, state)
+        row.update(id=entity_id, city=city, state=state,
+                   phone=f'{rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(1000, 9999)}',
+                   search_text=search_document(row['name'], city, state, genres))
+        rows.append(row)
+        links.extend({'genre_id': genre_ids[genre], foreign_key: entity_id} for genre in genres)
+        if len(rows) >= BATCH_SIZE:
+            _insert(model.__table__, rows)
+            _insert(association, links)
+    _insert(model.__table__, rows)
+    _insert(association, links)
+    _reset_sequence(model)
+    return list(range(first_id, first_id + count))
+
+
+def _nightly_counts(rng, shows, first_day, days):
+    weights = [WEEKDAY_WEIGHTS[(first_day + timedelta(days=day)).weekday()] for day in range(days)]
+    total = sum(weights)
+    counts = [int(shows * weight / total) for weight in weights]
+    for day in rng.sample(range(days), shows - sum(counts)):
+        counts[day] += 1
+    return counts
+
+
+def _shows(rng, shows, artist_ids, venue_ids, now):
+    # Popularity by rank; the shuffles keep it independent of the id order.
+    artist_ranks = rng.sample(artist_ids, len(artist_ids))
+    venue_ranks = rng.sample(venue_ids, len(venue_ids))
+    artist_weights = _zipf_weights(len(artist_ranks))
+    venue_weights = _zipf_weights(len(venue_ranks))
+
+    first_day = (now - timedelta(days=PAST_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+    days = PAST_DAYS + FUTURE_DAYS
+    rows = []
+    created = 0
+    for day, tonight in enumerate(_nightly_counts(rng, shows, first_day, days)):
+        # Distinct venues and artists each night, so nothing is double-booked.
+        venues = _distinct_choices(rng, venue_ranks, venue_weights, tonight)
+        artists = _distinct_choices(rng, artist_ranks, artist_weights, len(venues))
+        for venue_id, artist_id in zip(venues, artists):
+            start_time = first_day + timedelta(days=day, hours=rng.choice(START_HOURS))
+            rows.append({
+                'artist_id': artist_id,
+                'venue_id': venue_id,
+                'start_time': start_time,
+                'end_time': start_time + timedelta(minutes=rng.choice(DURATIONS)),
+            })
+            created += 1
+        if len(rows) >= BATCH_SIZE:
+            _insert(Show.__table__, rows)
+    _insert(Show.__table__, rows)
+    _reset_sequence(Show)
+    return created
+
+
+def seed(shows, artists=None, venues=None, random_seed=0, now=None):
+    """Add `shows` synthetic shows with their artists and venues.
+
+    By default there are enough artists and venues for the busiest night.
+    When fewer are given, nights are capped at one show per venue and per
+    artist. Returns the numbers of artists, venues and shows added.
+    """
+    rng = random.Random(random_seed)
+    now = now or datetime.now()
+    # Room for the busiest (Saturday) night with plenty of choice left.
+    busiest_night = math.ceil(shows * max(WEEKDAY_WEIGHTS) * 7 / sum(WEEKDAY_WEIGHTS)
+                              / (PAST_DAYS + FUTURE_DAYS))
+    artists = artists or max(10, shows // SHOWS_PER_ARTIST, busiest_night * 2)
+    venues = venues or max(5, shows // SHOWS_PER_VENUE, busiest_night * 2)
+
+    genre_ids = Genre.ids(name for name, _ in VenueForm.genres.kwargs['choices'])
+    artist_ids = _entities(
+        rng, Artist, artist_genres, 'artist_id', artists, genre_ids,
+        lambda entity_id, city, state: {
+            'name': f'{rng.choice(WORDS)} {rng.choice(ARTIST_NOUNS)} {entity_id}',
+            'seeking_venue': rng.random() < 0.3,
+            'image_link': f'https://images.example.com/artists/{entity_id}.jpg',
+        })
+    venue_ids = _entities(
+        rng, Venue, venue_genres, 'venue_id', venues, genre_ids,
+        lambda entity_id, city, state: {
+            'name': f'The {rng.choice(WORDS)} {rng.choice(VENUE_NOUNS)} {entity_id}',
+            'address': f'{rng.randint(1, 9999)} {rng.choice(WORDS)} St',
+            'seeking_talent': rng.random() < 0.3,
+            'image_link': f'https://images.example.com/venues/{entity_id}.jpg',
+            **_scattered(rng, city, state),
+        })
+    db.session.commit()
+
+    created = _shows(rng, shows, artist_ids, venue_ids, now)
+    counters.refresh_counters(artist_ids=artist_ids, venue_ids=venue_ids, now=now)
+    db.session.commit()
+    return len(artist_ids), len(venue_ids), created
+
+
+@click.command('seed')
+@click.option('--shows', default=10000, show_default=True, help='Number of shows to add.')
+@click.option('--artists', type=int, help=f'Defaults to one per {SHOWS_PER_ARTIST} shows.')
+@click.option('--venues', type=int, help=f'Defaults to one per {SHOWS_PER_VENUE} shows.')
+@click.option('--seed', 'random_seed', default=0, show_default=True,
+              help='Random seed; the same seed generates the same data.')
+@with_appcontext
+def seed_command(shows, artists, venues, random_seed):
+    """Fill the database with a synthetic catalogue."""
+    artists, venues, shows = seed(shows, artists, venues, random_seed)
+    click.echo(f'Added {artists} artists, {venues} venues and {shows} shows.')
+
+
+def init_app(app):
+    app.cli.add_command(seed_command)
@@ -0,0 +1,88 @@
+"""Worker and connection pool sizing for serving in production.
+
+Every worker process has its own SQLAlchemy pool, so the app can hold up to
+workers * pool_size connections. Workers scale with the CPU count up to what
+the connection budget, DB_MAX_CONNECTIONS less DB_RESERVED_CONNECTIONS for
+migrations, cron jobs and psql, can serve, and each pool gets an equal share
+of it with no overflow. Workers serving the live feed over Postgres also
+hold one LISTEN connection each, outside their pool, which comes out of
+the budget too. However many cores a machine has, the app never opens
+more connections than Postgres allows.
+
+Everything can be overridden from the environment:
+
+    GUNICORN_WORKER_CLASS   sync, gthread (default) or gevent
+    WEB_CONCURRENCY         worker processes (default 2 * cores + 1, cores + 1 for gevent)
+    GUNICORN_THREADS        threads per gthread worker (default 4)
+    GEVENT_CONNECTIONS      concurrent requests per gevent worker (default 100)
+    LIVE_STREAMS            serve the /shows/live feed, 1 or 0 (default 1 under gevent only)
+    LIVE_BACKEND            local or postgres (default postgres on Postgres); see live.py
+    DB_MAX_CONNECTIONS      Postgres max_connections (default 100)
+    DB_RESERVED_CONNECTIONS connections left for everything else (default 10)
+    DB_POOL_RECYCLE         seconds before a connection is replaced (default 1800)
+    DB_POOL_TIMEOUT         seconds to wait for a free connection (default 30)
+"""
+import os
+from collections import namedtuple
+
+WORKER_CLASSES = ('sync', 'gthread', 'gevent')
+
+WorkerPlan = namedtuple('WorkerPlan', 'worker_class workers threads worker_connections pool_size live_streams')
+
+
+def _int(environ, name, default):
+    value = environ.get(name)
+    return int(value) if value else default
+
+
+def _live_backend(environ):
+    backend = environ.get('LIVE_BACKEND')
+    if backend:
+        return backend
+    # The same default as live.init_app; config.py defaults to Postgres.
+    return 'postgres' if environ.get('DATABASE_URL', 'postgresql').startswith('postgresql') else 'local'
+
+
+def plan(cpu_count=None, environ=os.environ):
+    """Size the workers and their connection pools for this machine."""
+    worker_class = environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+    if worker_class not in WORKER_CLASSES:
+        raise ValueError(f'GUNICORN_WORKER_CLASS must be one of {", ".join(WORKER_CLASSES)}.')
+    cpu_count = cpu_count or os.cpu_count() or 1
+
+    threads = _int(environ, 'GUNICORN_THREADS', 4) if worker_class == 'gthread' else 1
+    worker_connections = _int(environ, 'GEVENT_CONNECTIONS', 100)
+    # Requests a single worker serves at once.
+    concurrency = {'sync': 1, 'gthread': threads, 'gevent': worker_connections}[worker_class]
+
+    # An event stream holds a request slot for as long as it is open: a gevent
+    # worker has plenty, a sync or gthread worker only its few threads.
+    live_streams = _int(environ, 'LIVE_STREAMS', int(worker_class == 'gevent')) == 1
+    listeners = 1 if live_streams and _live_backend(environ) == 'postgres' else 0
+
+    default_workers = cpu_count + 1 if worker_class == 'gevent' else cpu_count * 2 + 1
+    budget = max(1, _int(environ, 'DB_MAX_CONNECTIONS', 100)
+                 - _int(environ, 'DB_RESERVED_CONNECTIONS', 10))
+    # A sync or gthread worker needs a connection per thread, so rather than
+    # starving threads the worker count stops growing at the budget. gevent
+    # workers share what they get among their greenlets.
+    needed = (1 if worker_class == 'gevent' else concurrency) + listeners
+    workers = max(1, min(_int(environ, 'WEB_CONCURRENCY', default_workers), budget // needed))
+    pool_size = max(1, min(concurrency, budget // workers - listeners))
+    return WorkerPlan(worker_class, workers, threads, worker_connections, pool_size, live_streams)
+
+
+def engine_options(database_uri, environ=os.environ):
+    """SQLALCHEMY_ENGINE_OPTIONS for `database_uri` under the current plan."""
+    if not database_uri.startswith('postgresql'):
+        return {}
+    return {
+        # Send executemany() as multi-row INSERT ... VALUES (bulk import).
+        'executemany_mode': 'values',
+        'pool_size': plan(environ=environ).pool_size,
+        # Waiting for a connection beats going over the Postgres limit.
+        'max_overflow': 0,
+        'pool_timeout': _int(environ, 'DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _int(environ, 'DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+    }
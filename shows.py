@@ -0,0 +1,80 @@
+from flask import Blueprint, flash, render_template, request
+
+import cache
+import conditional
+import live
+import profiling
+import replicas
+import scheduling
+import tasks
+from models import db, Artist, Show, Venue
+from pagination import request_page
+
+bp = Blueprint('shows', __name__)
+
+
+@bp.route('/shows')
+@replicas.read_only
+@profiling.query_budget(2)
+@conditional.conditional(lambda: conditional.listing_version(Show, Artist, Venue))
+@cache.cached_page('shows')
+def shows():
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Artist, Artist.id == Show.artist_id).join(Venue, Venue.id == Show.venue_id)
+    data, next_cursor = request_page(query, (Show.start_time, Show.id))
+
+    response = []
+    for show in data:
+        response.append({
+            "venue_id": show.venue_id,
+            "venue_name": show.venue_name,
+            "artist_id": show.artist_id,
+            "artist_name": show.artist_name,
+            "artist_image_link": show.artist_image_link,
+            "start_time": str(show.start_time)
+        })
+    return render_template('pages/shows.html',
+                           results=response,
+                           next_cursor=next_cursor)
+
+
+@bp.route('/shows/create')
+def create_shows():
+    # renders form. do not touch.
+    from forms import ShowForm
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+
+@bp.route('/shows/create', methods=['POST'])
+def create_show_submission():
+    try:
+        show = scheduling.book(scheduling.slot(
+            request.form['artist_id'],
+            request.form['venue_id'],
+            request.form['start_time'],
+            request.form.get('duration')
+        ))
+        tasks.booked(show)
+        live.published(show)
+        db.session.commit()
+        cache.invalidate('shows', 'venues',
+                         f"artist:{request.form['artist_id']}", f"venue:{request.form['venue_id']}")
+        flash('Requested show was successfully listed')
+    except scheduling.SchedulingConflict as e:
+        flash(f'Requested show could not be listed. {e}')
+        db.session.rollback()
+    except Exception as e:
+        print(e)
+        flash('An error occurred. Requested show could not be listed.')
+        db.session.rollback()
+    finally:
+        db.session.close()
+    return render_template('pages/home.html')
@@ -2,3 +2,77 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Adds the shows booked while the page is open to the rows marked with
+// data-live-shows (the URL of the feed) and data-live-layout, in start time
+// order like the rest of the row.
+function showTile(show, layout) {
+  function element(tag, text, href) {
+    var node = document.createElement(href ? 'a' : tag);
+    if (href) {
+      node.href = href;
+    }
+    node.textContent = text;
+    return node;
+  }
+  function heading(tag, text, href) {
+    var node = document.createElement(tag);
+    node.appendChild(element(tag, text, href));
+    return node;
+  }
+
+  var column = document.createElement('div');
+  var tile = document.createElement('div');
+  var image = document.createElement('img');
+  column.className = 'col-sm-4';
+  column.setAttribute('data-start-time', show.start_time);
+  tile.className = 'tile tile-show';
+  image.src = show.artist_image_link || '';
+  image.alt = 'Artist Image';
+  tile.appendChild(image);
+  if (layout === 'venue') {
+    tile.appendChild(heading('h5', show.artist_name, '/artists/' + show.artist_id));
+    tile.appendChild(element('h6', show.start_time));
+  } else {
+    tile.appendChild(element('h4', show.start_time));
+    tile.appendChild(heading('h5', show.artist_name, '/artists/' + show.artist_id));
+    tile.appendChild(element('p', 'playing at'));
+    tile.appendChild(heading('h5', show.venue_name, '/venues/' + show.venue_id));
+  }
+  column.appendChild(tile);
+  return column;
+}
+
+// Inserts the tile before the first one starting later (ties go after, as
+// the newer booking). Rows marked data-live-more are a page of a longer
+// list, so a show after their last tile belongs to a later page.
+function insertTile(row, column) {
+  var startTime = column.getAttribute('data-start-time');
+  var tiles = row.querySelectorAll('[data-start-time]');
+  for (var i = 0; i < tiles.length; i++) {
+    if (tiles[i].getAttribute('data-start-time') > startTime) {
+      row.insertBefore(column, tiles[i]);
+      return;
+    }
+  }
+  if (!row.hasAttribute('data-live-more')) {
+    row.appendChild(column);
+  }
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+  if (!window.EventSource) {
+    return;
+  }
+  Array.prototype.forEach.call(document.querySelectorAll('[data-live-shows]'), function (row) {
+    var seen = {};
+    var source = new EventSource(row.getAttribute('data-live-shows'));
+    source.addEventListener('show', function (message) {
+      var show = JSON.parse(message.data);
+      if (!seen[show.id]) {
+        seen[show.id] = true;
+        insertTile(row, showTile(show, row.getAttribute('data-live-layout')));
+      }
+    });
+  });
+});
@@ -0,0 +1,22 @@
+import json
+from datetime import date, datetime
+
+BATCH_SIZE = 1000
+
+
+def stream(query, batch_size=BATCH_SIZE):
+    """Iterate `query` through a server-side cursor, `batch_size` rows at a time.
+
+    Memory stays bounded by the batch whatever the size of the result.
+    """
+    return query.execution_options(stream_results=True).yield_per(batch_size)
+
+
+def json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(value):
+    return json.dumps(value, separators=(',', ':'), default=json_default)
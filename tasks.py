@@ -0,0 +1,202 @@
+"""Post-write work run by `flask worker` instead of on the request path.
+
+After an artist or venue is saved its links are checked, a thumbnail is
+made of its image and its suggested matches are refreshed; after a show
+is booked the show counters and matches of its artist and venue are
+recomputed. The write handlers only enqueue the jobs
+(see jobs.py), keyed so that saving the same links twice, or retrying a
+booking, doesn't queue the work twice.
+
+Thumbnails need the optional Pillow package and are written to
+static/thumbnails/<artist|venue>-<id>.jpg.
+
+The links are user input, so they are only fetched from hosts that
+resolve to public addresses, and every redirect is checked the same way:
+the worker never reaches loopback, private or link-local (cloud metadata)
+addresses.
+"""
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+from datetime import datetime
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+
+from flask import current_app
+
+import counters
+import jobs
+from models import db, Artist, Venue
+
+MODELS = {'artist': Artist, 'venue': Venue}
+LINK_FIELDS = ('image_link', 'website', 'facebook_link')
+MATCH_FIELDS = ('city', 'state', 'address', 'seeking_venue', 'seeking_talent', 'genres')
+TIMEOUT = 10
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+THUMBNAIL_SIZE = (300, 300)
+USER_AGENT = 'Fyyur link checker'
+
+
+def _digest(*values):
+    return hashlib.sha1('\n'.join(value or '' for value in values).encode()).hexdigest()[:16]
+
+
+def _kind(entity):
+    return 'artist' if isinstance(entity, Artist) else 'venue'
+
+
+def _match_profile_changed(entity):
+    """Whether an unflushed artist or venue is new or changed what its matches are scored on."""
+    state = db.inspect(entity)
+    if state.key is None:
+        return True
+    return any(state.attrs[field].history.has_changes() for field in MATCH_FIELDS if field in state.attrs)
+
+
+def saved(entity):
+    """Queue the link check and thumbnail of a new or edited artist or venue."""
+    kind = _kind(entity)
+    # Read before the flush resets the attribute history.
+    rescore = _match_profile_changed(entity)
+    db.session.flush()
+    links = [getattr(entity, field) for field in LINK_FIELDS]
+    if any(links):
+        jobs.enqueue('check_links', key=f'links:{kind}:{entity.id}:{_digest(*links)}',
+                     model=kind, entity_id=entity.id)
+    if entity.image_link:
+        jobs.enqueue('thumbnail', key=f'thumbnail:{kind}:{entity.id}:{_digest(entity.image_link)}',
+                     model=kind, entity_id=entity.id, image_link=entity.image_link)
+    if rescore:
+        # Keyed per save: a profile that goes back to an earlier state must be
+        # rescored again, so a key that has run before can't be reused.
+        jobs.enqueue('refresh_matches', key=f'matches:{kind}:{entity.id}:{datetime.utcnow().isoformat()}',
+                     **{f'{kind}_ids': [entity.id]})
+
+
+def booked(show):
+    """Queue the counter and matches refresh for a new show."""
+    jobs.enqueue('refresh_counters', key=f'counters:show:{show.id}',
+                 artist_ids=[show.artist_id], venue_ids=[show.venue_id])
+    jobs.enqueue('refresh_matches', key=f'matches:show:{show.id}',
+                 artist_ids=[show.artist_id], venue_ids=[show.venue_id])
+
+
+def _refused(url):
+    """None when `url` is an http(s) URL of a public host, otherwise why not."""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        return 'not an http(s) URL'
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(
+            parts.hostname, parts.port or parts.scheme, proto=socket.IPPROTO_TCP)}
+    except (OSError, UnicodeError, ValueError) as error:
+        return f'cannot resolve {parts.hostname}: {error}'
+    for address in addresses:
+        # Scoped IPv6 addresses end in %<interface>.
+        if not ipaddress.ip_address(address.split('%')[0]).is_global:
+            return f'{parts.hostname} is not a public address'
+    return None
+
+
+class _CheckedRedirectHandler(HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        refused = _refused(newurl)
+        if refused:
+            raise URLError(f'redirect to {newurl} refused: {refused}')
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_opener = build_opener(_CheckedRedirectHandler)
+
+
+def _open(url, method='GET'):
+    refused = _refused(url)
+    if refused:
+        raise URLError(refused)
+    return _opener.open(Request(url, method=method, headers={'User-Agent': USER_AGENT}), timeout=TIMEOUT)
+
+
+def _probe(url):
+    """None when `url` answers with a success, otherwise why not."""
+    try:
+        try:
+            _open(url, 'HEAD').close()
+        except HTTPError as error:
+            # Plenty of servers don't do HEAD.
+            if error.code not in (403, 405, 501):
+                raise
+            _open(url).close()
+    except HTTPError as error:
+        return f'HTTP {error.code}'
+    except (URLError, OSError, ValueError) as error:
+        return str(getattr(error, 'reason', error))
+    return None
+
+
+@jobs.handler('check_links')
+def check_links(model, entity_id):
+    entity = MODELS[model].query.get(entity_id)
+    if entity is None:
+        return {'skipped': 'deleted'}
+    broken = {}
+    for field in LINK_FIELDS:
+        url = getattr(entity, field)
+        problem = _probe(url) if url else None
+        if problem:
+            broken[field] = problem
+    if broken:
+        current_app.logger.warning(f'Broken links on {model} {entity_id}: {broken}')
+    return {'broken': broken}
+
+
+@jobs.handler('thumbnail')
+def thumbnail(model, entity_id, image_link):
+    entity = MODELS[model].query.get(entity_id)
+    if entity is None or entity.image_link != image_link:
+        # A later edit queued its own thumbnail.
+        return {'skipped': 'superseded'}
+    try:
+        from PIL import Image
+    except ImportError:
+        return {'skipped': 'Pillow is not installed'}
+    refused = _refused(image_link)
+    if refused:
+        # Not worth retrying, unlike a failed download.
+        return {'skipped': refused}
+
+    with _open(image_link) as response:
+        data = response.read(MAX_IMAGE_BYTES + 1)
+    if len(data) > MAX_IMAGE_BYTES:
+        return {'skipped': 'image too large'}
+
+    image = Image.open(io.BytesIO(data))
+    image.thumbnail(THUMBNAIL_SIZE)
+    folder = os.path.join(current_app.static_folder, 'thumbnails')
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f'{model}-{entity_id}.jpg')
+    # Written aside and renamed, so pages never serve half a file.
+    image.convert('RGB').save(path + '.tmp', 'JPEG', quality=85)
+    os.replace(path + '.tmp', path)
+    return {'path': os.path.relpath(path, current_app.static_folder), 'size': list(image.size)}
+
+
+@jobs.handler('refresh_counters')
+def refresh_counters(artist_ids, venue_ids):
+    # The pages showing the counters are versioned by updated_at, which the
+    # refresh bumps; no invalidation from this process is needed (or would
+    # reach the web workers' caches).
+    counters.refresh_counters(artist_ids=artist_ids, venue_ids=venue_ids)
+    return {'artists': len(artist_ids), 'venues': len(venue_ids)}
+
+
+@jobs.handler('refresh_matches')
+def refresh_matches(artist_ids=(), venue_ids=()):
+    # The detail versions include the matches' computed_at, so the pages and
+    # their ETags move with the refresh in every process. Imported here so
+    # web workers, which only queue this job, never load NumPy.
+    import matches
+    refreshed = matches.refresh(artist_ids, venue_ids)
+    return {'artists': len(refreshed['artist']), 'venues': len(refreshed['venue'])}
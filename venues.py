@@ -0,0 +1,165 @@
+import json
+
+from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
+
+import cache
+import conditional
+import details
+import listings
+import profiling
+import replicas
+import search
+import tasks
+from models import db, Genre, Show, Venue
+from pagination import InvalidCursor
+
+bp = Blueprint('venues', __name__)
+
+
+#  Create Venue
+
+
+@bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+    from forms import VenueForm
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+
+@bp.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+    try:
+        venue = Venue(
+            name=request.form['name'],
+            city=request.form['city'],
+            state=request.form['state'],
+            address=request.form['address'],
+            phone=request.form['phone'],
+            genres=Genre.named(request.form.getlist('genres')),
+            image_link=request.form['image_link'],
+            facebook_link=request.form['facebook_link'],
+            website=request.form['website'],
+            seeking_talent=json.loads(request.form['seeking_talent'].lower()),
+            seeking_description=request.form['seeking_description']
+        )
+        db.session.add(venue)
+        tasks.saved(venue)
+        db.session.commit()
+        cache.invalidate('venues')
+        flash('Venue ' + request.form['name'] +
+              ' was successfully listed!')
+    except Exception as e:
+        print(e)
+        flash('An error occurred. Venue ' + request.form['name'] + ' could not be added')
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+    return render_template('pages/home.html')
+
+
+@bp.route('/venues')
+@replicas.read_only
+@profiling.query_budget(2)
+@conditional.conditional(lambda: conditional.listing_version(Venue))
+@cache.cached_page('venues')
+def venues():
+    try:
+        areas, next_cursor = listings.venue_areas(request.args.get('after'), request.args.get('limit'),
+                                                  **listings.request_filters())
+    except InvalidCursor:
+        abort(400)
+    return render_template('pages/venues.html', areas=areas, next_cursor=next_cursor)
+
+
+@bp.route('/venues/search', methods=['GET', 'POST'])
+@replicas.read_only
+@profiling.query_budget(2)
+def search_venues():
+    search_term = request.values.get('search_term', '')
+    response = search.search_venues(search_term, **search.request_options())
+
+    return render_template('pages/search_venues.html',
+                           results=response,
+                           search_term=search_term)
+
+
+@bp.route('/venues/<int:venue_id>')
+@replicas.read_only
+@profiling.query_budget(4)
+@conditional.conditional(conditional.venue_version)
+@cache.cached_page('venue:{venue_id}')
+def show_venue(venue_id):
+    detail = details.load_venue(venue_id)
+    if detail is None:
+        abort(404)
+    venue, genres, past_shows, upcoming_shows, next_show_at = detail
+    cache.expire_at(next_show_at)
+
+    response = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+        "suggested_artists": details.suggested('venue', venue_id),
+    }
+
+    return render_template('pages/show_venue.html', venue=response)
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+    from forms import VenueForm
+    form = VenueForm()
+    venue = Venue.query.filter(Venue.id == venue_id).first()
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+    venue = Venue.query.filter(Venue.id == venue_id).first()
+    try:
+        venue.name = request.form['name']
+        venue.city = request.form['city']
+        venue.state = request.form['state']
+        venue.address = request.form['address']
+        venue.phone = request.form['phone']
+        venue.genres = Genre.named(request.form.getlist('genres'))
+        venue.image_link = request.form['image_link']
+        venue.facebook_link = request.form['facebook_link']
+        venue.website = request.form['website']
+        venue.seeking_talent = json.loads(request.form['seeking_talent'].lower())
+        venue.seeking_description = request.form['seeking_description']
+        db.session.add(venue)
+        tasks.saved(venue)
+        db.session.commit()
+        invalidate_venue_pages(venue_id)
+        flash('Venue ' + request.form['name'] +
+              ' was successfully listed!')
+    except Exception as e:
+        print(e)
+        flash('An error occurred. Venue ' + request.form['name'] + ' could not be added')
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))
+
+
+def invalidate_venue_pages(venue_id):
+    # Artist pages list the venues of their shows.
+    artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+    cache.invalidate('venues', 'shows', f'venue:{venue_id}',
+                     *(f'artist:{artist_id}' for artist_id, in artist_ids))